@@ -12,6 +12,10 @@ from pygame.sprite import Sprite
 from pygame.surface import Surface
 from pygame.rect import Rect
 
+from assets import ASSETS
+from masks import MaskCache
+from rotationcache import RotationCache
+
 class Actor(Sprite):
     """
     Represents an abstract actor
@@ -24,6 +28,8 @@ class Actor(Sprite):
     orig_hitboxes = []
     # Theses hitboxes get their (x, y) updated to follow the sprite
     hitboxes = []
+    # Bounding box of all the hitboxes, used to reject collisions early
+    aabb = None
 
     # Actor movement speed
     speed = 6
@@ -34,6 +40,14 @@ class Actor(Sprite):
     # Activate the collisions
     can_collide = True
 
+    # (frame, x, y) before the last simulation tick, see Game.store_positions
+    previous_position = None
+
+    # Rotated sprites shared by every actor
+    rotation_cache = RotationCache()
+    # Masks of the sprites shared by every actor
+    mask_cache = MaskCache()
+
     def __init__(self, master : "Game", img: Surface, x: int = 0, y: int = 0):
         Sprite.__init__(self)
 
@@ -73,12 +87,29 @@ class Actor(Sprite):
             self.hitboxes[rect].y = self.orig_hitboxes[rect].y +\
                 self.rect.y
 
+        # The original bounding box only changes with the hitboxes list
+        if self.aabb is None or self.aabb_source is not self.orig_hitboxes:
+            self.aabb_source = self.orig_hitboxes
+            if self.orig_hitboxes:
+                self.orig_aabb = self.orig_hitboxes[0].unionall(self.orig_hitboxes)
+            else:
+                self.orig_aabb = Rect(0, 0, 0, 0)
+            self.aabb = self.orig_aabb.copy()
+
+        self.aabb.x = self.orig_aabb.x + self.rect.x
+        self.aabb.y = self.orig_aabb.y + self.rect.y
+
     def detect_collision(self, actor) -> bool:
         """
         Detect collision with another actor
         """
 
         if actor.can_collide and self.can_collide:
+            if self.game_master is not None and self.game_master.pixel_collisions:
+                return self.detect_pixel_collision(actor)
+            # Cheap rejection with the bounding boxes
+            if not self.aabb.colliderect(actor.aabb):
+                return False
             # For each sub hitbox of self, test if it collides
             # with the whole hitbox of the given actor
             for hitbox in self.hitboxes:
@@ -87,6 +118,17 @@ class Actor(Sprite):
                         return True
         return False
 
+    def detect_pixel_collision(self, actor) -> bool:
+        """
+        Detect collision with another actor using the solid pixels
+        of their current images instead of the hitboxes.
+        """
+        # The masks are only compared if the sprites overlap
+        if not self.rect.colliderect(actor.rect):
+            return False
+        return self.mask_cache.overlap(self.image, self.rect.topleft,
+                                       actor.image, actor.rect.topleft)
+
     def is_out_of_bound(self, x_bound_inf: int, x_bound_sup: int,
                         y_bound_inf: int, y_bound_sup: int) -> (bool, bool):
         """
@@ -111,32 +153,41 @@ class Actor(Sprite):
         rotate an image while keeping its center and size
         """
         self.rotation += angle
-        orig_rect = self.rect.copy()
-        rot_image = self.orig_image.copy()
-        rot_image = pygame.transform.rotate(rot_image, self.rotation)
-        rot_rect = orig_rect.copy()
-        rot_rect.center = rot_image.get_rect().center
-        rot_image = rot_image.subsurface(rot_rect).copy()
-        rot_rect.bottomleft = orig_rect.bottomleft
-        self.image = rot_image
-        self.rect = rot_rect
+        self.image = self.rotation_cache.get(self.source_image, self.rotation)
 
     def set_image(self, image: Surface, x_pos: int = 0, y_pos: int = 0):
         """
         Set the given image as actor sprite. A position (x, y) can
         be given to change the image rect origin.
         """
-        self.orig_image = image.convert_alpha()
-        self.image = self.orig_image.copy()
+        # The given image is the rotation cache key, it is shared
+        # between the actors using the same sprite
+        self.source_image = image
+        # Images from the registry are already converted and shared
+        if ASSETS.owns(image):
+            self.orig_image = image
+        else:
+            self.orig_image = image.convert_alpha()
+        self.image = self.orig_image
         self.rect = image.get_rect()
         self.rect.x = x_pos
         self.rect.y = y_pos
 
     def copy(self):
         """
-        Make a copy of the actor
-        """
-        copy = Actor(self.game_master, self.image, self.rect.x, self.rect.y)
+        Make a copy of the actor, sharing its images.
+        The copy belongs to no sprite group. The other objects it
+        refers to are shared too, see Player.copy.
+        """
+        copy = self.__class__.__new__(self.__class__)
+        Sprite.__init__(copy)
+        attributes = copy.__dict__
+        for name, value in self.__dict__.items():
+            attributes.setdefault(name, value)
+        copy.rect = self.rect.copy()
+        copy.hitboxes = [hitbox.copy() for hitbox in self.hitboxes]
+        if self.aabb is not None:
+            copy.aabb = self.aabb.copy()
         return copy
 
 
@@ -155,4 +206,20 @@ if __name__ == '__main__':
     assert(actor.is_out_of_bound(0, 50, 0, 200)[0])
     assert(not actor.is_out_of_bound(0, 200, 0, 200)[0])
     actor.rotate(90)
-    actor.rotate(-90)
\ No newline at end of file
+    actor.rotate(-90)
+
+    copy = actor.copy()
+    copy.move(0)
+    assert copy.rect.x == actor.rect.x + copy.speed
+    assert copy.image is actor.image
+
+    # pixel perfect collisions ignore the hitboxes
+    class Master(object):
+        pixel_collisions = True
+    disc = pygame.surface.Surface((20, 20), pygame.SRCALPHA)
+    pygame.draw.circle(disc, (255, 255, 255), (10, 10), 10)
+    first = Actor(Master(), disc, 0, 0)
+    second = Actor(Master(), disc, 17, 17)
+    assert not first.detect_collision(second)
+    second.rect.topleft = (15, 5)
+    assert first.detect_collision(second)
\ No newline at end of file
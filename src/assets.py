@@ -0,0 +1,141 @@
+"""
+Assets module.
+Loads the game images once and shares them between the actors.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import os
+import pygame
+from pygame.surface import Surface
+
+
+class AssetRegistry(object):
+    """
+    Loads, converts and caches the images.
+    Every image is read from the disk and converted to the
+    display format only once, then the same surface is given to
+    everybody asking for it. The surfaces are shared, so they
+    must be considered read-only.
+    """
+
+    # Folder containing the images
+    root = "resources"
+
+    def __init__(self, root: str = None):
+        if root is not None:
+            self.root = root
+
+        # relative path -> surface
+        self.images = {}
+        # relative paths of the images not converted yet
+        self.pending = set()
+        # ids of the surfaces owned by the registry
+        self.owned = set()
+
+    def image(self, *path: str) -> Surface:
+        """
+        Returns the image at the given path, relative to the
+        resources folder. i.e. image("items", "life.png")
+        The image is converted to the display format as soon as
+        a display exists.
+        """
+        key = os.path.join(*path)
+        surface = self.images.get(key)
+
+        if surface is not None and key not in self.pending:
+            return surface
+
+        if surface is None:
+            surface = pygame.image.load(os.path.join(self.root, key))
+            self.pending.add(key)
+
+        # conversion needs a display mode
+        if pygame.display.get_surface() is not None:
+            surface = self.convert(surface)
+            self.pending.discard(key)
+
+        self.store(key, surface)
+        return surface
+
+    def convert(self, surface: Surface) -> Surface:
+        """
+        Converts a surface to the display format, keeping its
+        alpha channel if it has one.
+        """
+        if surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
+    def store(self, key: str, surface: Surface) -> None:
+        """
+        Registers a surface under the given key.
+        """
+        old = self.images.get(key)
+        if old is not None:
+            self.owned.discard(id(old))
+        self.images[key] = surface
+        if key not in self.pending:
+            self.owned.add(id(surface))
+
+    def owns(self, surface: Surface) -> bool:
+        """
+        Indicates whether the surface comes from the registry,
+        and so is already converted.
+        """
+        return id(surface) in self.owned
+
+    def preload(self, paths: "list of tuple of str") -> None:
+        """
+        Loads a list of images, given as path tuples.
+        """
+        for path in paths:
+            self.image(*path)
+
+    def memory_footprint(self) -> int:
+        """
+        Returns the memory used by the cached images, in bytes.
+        """
+        return sum(surface.get_pitch() * surface.get_height()
+                   for surface in self.images.values())
+
+    def clear(self) -> None:
+        """
+        Forgets every cached image.
+        """
+        self.images.clear()
+        self.pending.clear()
+        self.owned.clear()
+
+
+# The registry used by the game
+ASSETS = AssetRegistry()
+
+
+if __name__ == '__main__':
+
+    pygame.init()
+
+    registry = AssetRegistry()
+
+    # Loaded before the display exists: not converted yet
+    raw = registry.image("heart.png")
+    assert "heart.png" in registry.pending
+    assert not registry.owns(raw)
+
+    pygame.display.set_mode((400, 300))
+
+    heart = registry.image("heart.png")
+    assert heart is not raw
+    assert registry.image("heart.png") is heart
+    assert registry.owns(heart)
+    assert not registry.owns(raw)
+    assert not registry.pending
+
+    registry.preload([("items", "life.png"), ("asteroid.png",)])
+    assert registry.image("items", "life.png") is registry.images[os.path.join("items", "life.png")]
+    assert registry.memory_footprint() > 0
+    registry.clear()
+    assert registry.memory_footprint() == 0
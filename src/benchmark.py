@@ -0,0 +1,273 @@
+"""
+Benchmark module.
+Runs the game headless on canned workloads and reports its
+throughput, so that the performances of two commits can be
+compared.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json --threshold 0.1
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+from simulation import Simulation, use_dummy_drivers
+
+# Workloads: number of players, number of obstacles kept on the field,
+# and the game settings changed
+SCENARIOS = OrderedDict([
+    ("idle", {
+        "players" : 2, "obstacles" : 0,
+        "settings" : {"MAXIMUM_OBSTACLE" : 0, "item_spawn_laps" : 10 ** 9}
+    }),
+    ("obstacles_10", {
+        "players" : 2, "obstacles" : 10,
+        "settings" : {"MAXIMUM_OBSTACLE" : 10}
+    }),
+    ("obstacles_500", {
+        "players" : 2, "obstacles" : 500,
+        "settings" : {"MAXIMUM_OBSTACLE" : 500}
+    }),
+    ("obstacles_500_field", {
+        "players" : 2, "obstacles" : 500, "field" : True,
+        "settings" : {"MAXIMUM_OBSTACLE" : 500}
+    }),
+    ("players_4_items", {
+        "players" : 4, "obstacles" : 10,
+        "settings" : {"MAXIMUM_OBSTACLE" : 10, "item_spawn_laps" : 0.25,
+                      "item_spawn_rate" : 30}
+    }),
+    ("rotation_storm", {
+        "players" : 2, "obstacles" : 500, "rotating_speed" : 37.5,
+        "settings" : {"MAXIMUM_OBSTACLE" : 500}
+    }),
+])
+
+# frames used by the allocations measure, which is slow
+ALLOCATION_FRAMES = 60
+
+
+def random_inputs(game: "Game", frame: int) -> list:
+    """
+    Players' inputs of the benchmarks: each player changes of
+    direction every half second.
+    """
+    keys = []
+    for i, player in enumerate(game.players):
+        controller = player.controller
+        direction = ((frame // 30) * 7 + i * 3) % 5
+        if direction < 4:
+            keys.append((controller.old_key_right, controller.old_key_up,
+                         controller.old_key_left, controller.old_key_down)[direction])
+    return keys
+
+
+def fill_obstacles(game: "Game", count: int, rotating_speed: float = None) -> None:
+    """
+    Adds obstacles at random places until there are count of them,
+    taken from the game's pool like the spawned ones.
+    """
+    while game.obstacle_count() < count:
+        x_pos = game.rng.randrange(0, game.window_playable_width)
+        y_pos = game.rng.randrange(-game.obstacle_img.get_height(), game.window_playable_height)
+        if game.obstacle_field is not None:
+            game.obstacle_field.spawn(x_pos, y_pos, rotating_speed=rotating_speed)
+        else:
+            obstacle = game.obstacle_pool.acquire(game, x_pos, y_pos)
+            if rotating_speed is not None:
+                obstacle.rotating_speed = rotating_speed
+            game.obstacles.append(obstacle)
+
+
+def setup(name: str, seed: int) -> Simulation:
+    """
+    Creates the simulation of a scenario.
+    """
+    scenario = SCENARIOS[name]
+    sim = Simulation(scenario["players"], random_inputs, seed=seed)
+    game = sim.game
+    for setting, value in scenario["settings"].items():
+        setattr(game, setting, value)
+    if scenario.get("field"):
+        game.create_obstacle_field()
+    sim.reset()
+    return sim
+
+
+def run_frames(sim: Simulation, scenario: dict, frames: int, draw: bool) -> None:
+    """
+    Computes the given number of frames, keeping the obstacles count.
+    """
+    game = sim.game
+    profiler = game.profiler
+    for _ in range(frames):
+        profiler.start_frame()
+        fill_obstacles(game, scenario["obstacles"], scenario.get("rotating_speed"))
+        sim.keys.set(random_inputs(game, game.frame + 1))
+        profiler.mark("inputs")
+        game.update()
+        if draw:
+            game.draw()
+        profiler.end_frame()
+
+
+def run_scenario(name: str, frames: int = 600, seed: int = 0, draw: bool = True) -> dict:
+    """
+    Runs a scenario and returns its measures.
+    """
+    from profiler import FrameProfiler
+
+    scenario = SCENARIOS[name]
+
+    # throughput and phases timings
+    sim = setup(name, seed)
+    profiler = FrameProfiler(history=frames)
+    sim.game.profiler = profiler
+    start = time.perf_counter()
+    run_frames(sim, scenario, frames, draw)
+    elapsed = time.perf_counter() - start
+    obstacles = sim.game.obstacle_count()
+
+    # allocations, measured apart since tracing them is slow
+    sim = setup(name, seed)
+    run_frames(sim, scenario, 10, draw)
+    tracemalloc.start()
+    peaks = []
+    for _ in range(ALLOCATION_FRAMES):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run_frames(sim, scenario, 1, draw)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    result = OrderedDict()
+    result["frames"] = frames
+    result["fps"] = frames / elapsed
+    result["obstacles"] = obstacles
+    result["phases_ms"] = profiler.summary()
+    result["alloc_bytes_per_frame"] = sum(peaks) / float(len(peaks))
+    result["peak_rss_kib"] = peak_rss()
+    return result
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak resident memory of the process, in KiB.
+    """
+    if resource is None:
+        return -1
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def isolated_run(args: tuple) -> dict:
+    """
+    Runs a scenario in a worker process, so that its peak memory
+    is measured alone.
+    """
+    use_dummy_drivers()
+    return run_scenario(*args)
+
+
+def run_all(names: list, frames: int, seed: int, draw: bool) -> "OrderedDict":
+    """
+    Runs the scenarios, each in a new process.
+    """
+    results = OrderedDict()
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        pool = context.Pool(1)
+        results[name] = pool.apply(isolated_run, ((name, frames, seed, draw),))
+        # SDL handles SIGTERM, so the worker must exit by itself
+        pool.close()
+        pool.join()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns the regressions of the results compared to a baseline:
+    the scenarios whose fps dropped, or whose p95 frame time grew,
+    by more than the threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        if result["fps"] < old["fps"] * (1.0 - threshold):
+            regressions.append("{}: fps {:.1f} -> {:.1f}".format(name, old["fps"], result["fps"]))
+        old_p95 = old["phases_ms"].get("frame", {}).get("p95")
+        new_p95 = result["phases_ms"].get("frame", {}).get("p95")
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1.0 + threshold):
+            regressions.append("{}: p95 frame {:.3f} ms -> {:.3f} ms".format(name, old_p95,
+                                                                           new_p95))
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Save Your Assteroid benchmarks")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS),
+                        help="scenarios to run, all by default: " + ", ".join(SCENARIOS))
+    parser.add_argument("--frames", type=int, default=600, help="frames per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-draw", action="store_true", help="only runs the simulation")
+    parser.add_argument("--output", metavar="FILE", help="writes the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="results to compare with, exits with 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    import pygame
+
+    results = run_all(args.scenarios, args.frames, args.seed, not args.no_draw)
+    report = OrderedDict([
+        ("python", platform.python_version()),
+        ("pygame", pygame.version.ver),
+        ("machine", platform.machine()),
+        ("frames", args.frames),
+        ("seed", args.seed),
+        ("draw", not args.no_draw),
+        ("scenarios", results)
+    ])
+
+    for name, result in results.items():
+        frame = result["phases_ms"].get("frame", {})
+        print("{:<22} {:9.1f} fps  p50 {:7.3f} ms  p95 {:7.3f} ms  {:9.0f} B/frame  {:7d} KiB"
+              .format(name, result["fps"], frame.get("p50", 0), frame.get("p95", 0),
+                      result["alloc_bytes_per_frame"], result["peak_rss_kib"]))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+Bots module.
+Computer players. A bot chooses the input mask of its player
+(see inputs.py) at each frame. DangerFieldBot needs NumPy, imported
+only when such a bot plays (see dangerfield.py).
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import random
+import time
+
+from inputs import UP, LEFT, DOWN, RIGHT, InputSource, pressed_keys
+from playercontroller import Player_Controller
+from simulation import KeyState
+
+# Every move a bot can choose
+MOVES = (0, UP, LEFT, DOWN, RIGHT, UP | LEFT, UP | RIGHT, DOWN | LEFT, DOWN | RIGHT)
+
+
+class Bot(object):
+    """
+    Represents an abstract bot.
+    """
+
+    def __init__(self, seed: int = None):
+        self.rng = random.Random(seed)
+
+    def reset(self, seed: int = None) -> None:
+        """
+        Prepares the bot for a new round.
+        """
+        self.rng.seed(seed)
+
+    def act(self, game: "Game", player: "Player") -> int:
+        """
+        Returns the input mask of the player for the next frame.
+        Must be overriden.
+        """
+        return 0
+
+
+class RandomBot(Bot):
+    """
+    Moves randomly, keeping each move for a few frames.
+    """
+
+    # frames during which a move is kept
+    hold = 15
+
+    def __init__(self, seed: int = None, hold: int = None):
+        Bot.__init__(self, seed)
+        if hold is not None:
+            self.hold = hold
+        self.move = 0
+        self.frames = 0
+
+    def reset(self, seed: int = None) -> None:
+        Bot.reset(self, seed)
+        self.move = 0
+        self.frames = 0
+
+    def act(self, game: "Game", player: "Player") -> int:
+        if self.frames <= 0:
+            self.move = self.rng.choice(MOVES)
+            self.frames = self.hold
+        self.frames -= 1
+        return self.move
+
+
+class LookaheadBot(Bot):
+    """
+    Searches the best move by simulating the next frames.
+    Each frame, ghosts of the player and of the nearest obstacles are
+    copied, and every move is played for horizon frames on the ghosts,
+    with the player's Player.move and Actor.detect_collision.
+    The search stops when the time budget is spent, even while the
+    ghosts are copied: the moves are then compared on the frames
+    simulated so far.
+    """
+
+    # number of simulated frames
+    horizon = 20
+    # maximum time spent per decision, in s
+    budget = 0.002
+    # maximum number of simulated obstacles, the nearest ones
+    max_ghosts = 24
+    # clock of the budget, in s
+    clock = time.perf_counter
+
+    # penalty of a crash or of leaving the field, scaled by its earliness
+    crash_penalty = 1000.0
+    # reward for reaching a bonus item
+    item_reward = 5.0
+    # penalty per pixel away from the middle of the field
+    off_center_penalty = 0.01
+
+    def __init__(self, seed: int = None, horizon: int = None, budget: float = None):
+        Bot.__init__(self, seed)
+        if horizon is not None:
+            self.horizon = horizon
+        if budget is not None:
+            self.budget = budget
+        self.move = 0
+        # template of the ghosts of the obstacle field
+        self.template = None
+        # number of decisions stopped by the budget
+        self.over_budget = 0
+        # number of frames simulated by the last decision
+        self.depth = 0
+
+    def reset(self, seed: int = None) -> None:
+        Bot.reset(self, seed)
+        self.move = 0
+        self.over_budget = 0
+        self.depth = 0
+
+    def directions(self, controller: Player_Controller, mask: int) -> list:
+        """
+        Returns the directions the player moves to with a mask,
+        through its controller, i.e. with the controls inverted.
+        """
+        keys = KeyState(pressed_keys([controller.master], [mask]))
+        directions = []
+        if keys[controller.key_up]:
+            directions.append(1)
+        if keys[controller.key_left]:
+            directions.append(2)
+        if keys[controller.key_down]:
+            directions.append(3)
+        if keys[controller.key_right]:
+            directions.append(0)
+        return directions
+
+    def ghost_obstacles(self, game: "Game", player: "Player", deadline: float = None) -> list:
+        """
+        Returns copies of the obstacles which could reach the player
+        within the horizon, the nearest first and at most max_ghosts
+        of them. The copies stop at the deadline.
+        """
+        reach = self.horizon * (player.speed + 10) + 40
+        area = player.rect.inflate(2 * reach, 2 * reach)
+        x, y = player.rect.center
+
+        # (squared distance, obstacle, index in the obstacle field)
+        candidates = []
+        for obstacle in game.obstacles:
+            if obstacle.can_collide and area.colliderect(obstacle.rect):
+                dx = obstacle.rect.centerx - x
+                dy = obstacle.rect.centery - y
+                candidates.append((dx * dx + dy * dy, obstacle, None))
+
+        field = game.obstacle_field
+        if field is not None and field.count:
+            n = field.count
+            xs = field.x[:n]
+            ys = field.y[:n]
+            near = (~field.destroyed[:n] & (xs >= area.left) & (xs < area.right) &
+                    (ys >= area.top) & (ys < area.bottom)).nonzero()[0]
+            dx = xs[near] + field.width / 2.0 - x
+            dy = ys[near] + field.height / 2.0 - y
+            distances = dx * dx + dy * dy
+            if len(near) > self.max_ghosts:
+                nearest = distances.argpartition(self.max_ghosts)[:self.max_ghosts]
+                near, distances = near[nearest], distances[nearest]
+            candidates.extend((float(distance), None, int(i))
+                              for distance, i in zip(distances, near))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        ghosts = []
+        for distance, obstacle, i in candidates[:self.max_ghosts]:
+            if deadline is not None and self.clock() > deadline:
+                break
+            if obstacle is not None:
+                ghosts.append(obstacle.copy())
+                continue
+            if self.template is None:
+                from obstacle import Obstacle
+                self.template = Obstacle(None, 0, 0)
+            ghost = self.template.copy()
+            ghost.game_master = game
+            ghost.rect.x = int(field.x[i])
+            ghost.rect.y = int(field.y[i])
+            ghost.move_x = float(field.move_x[i])
+            ghost.speed = float(field.speed[i])
+            ghost.update_hitboxes()
+            ghosts.append(ghost)
+        return ghosts
+
+    def act(self, game: "Game", player: "Player") -> int:
+        if not player.alive:
+            return 0
+        deadline = self.clock() + self.budget
+
+        # move -> [ghost, directions, score, still running]
+        plans = []
+        for move in MOVES:
+            plans.append([player.copy(), self.directions(player.controller, move), 0.0, True])
+
+        obstacles = self.ghost_obstacles(game, player, deadline)
+        items = [item for item in game.items if item.bonus and not item.enabled]
+        width = game.window_playable_width
+        height = game.window_playable_height
+
+        frames = 0
+        for frame in range(1, self.horizon + 1):
+            if self.clock() > deadline:
+                self.over_budget += 1
+                break
+            for obstacle in obstacles:
+                obstacle.move()
+            earliness = (self.horizon - frame + 1) / float(self.horizon)
+            for plan in plans:
+                if not plan[3]:
+                    continue
+                ghost = plan[0]
+                for direction in plan[1]:
+                    ghost.move(direction)
+                if game.player_leave_border(ghost)[0]:
+                    plan[2] -= self.crash_penalty * earliness
+                    plan[3] = False
+                    continue
+                ghost.rect.clamp_ip(game.playable_rect)
+                ghost.update_hitboxes()
+                for obstacle in obstacles:
+                    if ghost.detect_collision(obstacle):
+                        plan[2] -= self.crash_penalty * earliness
+                        plan[3] = False
+                        break
+                for item in items:
+                    if ghost.detect_collision(item):
+                        plan[2] += self.item_reward * earliness
+                        items = [other for other in items if other is not item]
+                        break
+            frames = frame
+        self.depth = frames
+
+        # without any simulated frame, keep the last move
+        if frames == 0:
+            return self.move
+
+        best = None
+        for move, plan in zip(MOVES, plans):
+            ghost = plan[0]
+            score = plan[2] - self.off_center_penalty *\
+                (abs(ghost.rect.centerx - width / 2.0) + abs(ghost.rect.centery - height * 0.75))
+            # ties keep the current move, then the first one
+            if best is None or score > best[0] or (score == best[0] and move == self.move):
+                best = (score, move)
+        self.move = best[1]
+        return self.move
+
+
+class BotSource(InputSource):
+    """
+    Input source of a game whose seats are driven by bots: the mask
+    of a seat given to a bot is the bot's move, the other ones come
+    from the base source. The bots' moves are thus sampled, and
+    recorded, like the humans' inputs, and go through the players'
+    controls, so the items' effects apply like for a human.
+    """
+
+    def __init__(self, base: InputSource, bots: "dict of int -> Bot"):
+        self.base = base
+        # index of a player -> its bot
+        self.bots = bots
+
+    def sample(self, game: "Game") -> "list of int":
+        players = game.players
+        masks = list(self.base.sample(game))[:len(players)]
+        masks += [0] * (len(players) - len(masks))
+        for i, bot in self.bots.items():
+            if i < len(players):
+                masks[i] = bot.act(game, players[i])
+        return masks
+
+
+class DangerFieldBot(Bot):
+    """
+    Cheap bot going away from the danger, see dangerfield.py.
+    The bots of a game share their field, so dozens of them cost
+    about the same as one. Needs NumPy.
+    """
+
+    def act(self, game: "Game", player: "Player") -> int:
+        from dangerfield import DangerField
+        return DangerField.of(game).mask(player)
+
+
+# name -> bot class, used by the command lines
+BOTS = {
+    "idle" : Bot,
+    "random" : RandomBot,
+    "lookahead" : LookaheadBot,
+    "danger" : DangerFieldBot
+}
+
+
+def bots_inputs(bots: "list of Bot"):
+    """
+    Returns the inputs of a Simulation whose players are driven by
+    the given bots, one per player.
+    """
+    def inputs(game: "Game", frame: int) -> list:
+        masks = [bot.act(game, player) for bot, player in zip(bots, game.players)]
+        return pressed_keys(game.players, masks)
+    return inputs
+
+
+if __name__ == '__main__':
+
+    from simulation import Simulation
+
+    bots = [RandomBot(1, hold=5), RandomBot(2, hold=5)]
+    sim = Simulation(2, bots_inputs(bots), seed=7)
+    sim.run(300)
+    positions = [player.rect.topleft for player in sim.game.players]
+
+    # same seeds, same round
+    for i, bot in enumerate(bots):
+        bot.reset(i + 1)
+    sim.reset()
+    sim.run(300)
+    assert positions == [player.rect.topleft for player in sim.game.players]
+    assert Bot().act(sim.game, sim.game.players[0]) == 0
+
+    # the lookahead bot survives longer than the random one
+    def survival(bot):
+        sim = Simulation(1, bots_inputs([bot]), seed=3)
+        sim.game.MAXIMUM_OBSTACLE = 20
+        sim.reset()
+        return sim.run(60 * 20)
+    assert survival(LookaheadBot(budget=0.05)) > survival(RandomBot(3))
+
+    # as an input source, with the obstacle field too
+    sim = Simulation(1, seed=5)
+    sim.game.create_obstacle_field()
+    bot = LookaheadBot(budget=0.002)
+    sim.game.input_source = BotSource(sim.game.input_source, {0 : bot})
+    sim.run(300)
+
+    # a round with a bot seat is recorded with the bot's moves, and replayed
+    import os
+    import tempfile
+    from replay import ReplayWriter, Replay
+
+    sim = Simulation(2, lambda game, frame: [game.players[0].controller.old_key_left]
+                     if frame % 60 < 30 else [], seed=9)
+    game = sim.game
+    game.input_source = BotSource(game.input_source, {1 : LookaheadBot(9, budget=0.001)})
+    path = os.path.join(tempfile.mkdtemp(), "bots.rep")
+    game.replay_writer = ReplayWriter(path, game, keyframe_interval=100)
+    digests = []
+    for _ in range(240):
+        sim.step()
+        digests.append(game.state_digest())
+    game.replay_writer.close()
+    game.replay_writer = None
+
+    replay = Replay(path)
+    inputs = replay.seek(game, 0)
+    for digest in digests:
+        replay.step(game, next(inputs))
+        assert game.state_digest() == digest
+    replay.close()
+
+    # within its budget among thousands of obstacles, simulating the nearest ones
+    sim = Simulation(1, seed=6)
+    sim.game.create_obstacle_field()
+    for _ in range(2000):
+        sim.game.obstacle_field.spawn(sim.game.rng.randrange(sim.game.window_playable_width),
+                                      sim.game.rng.randrange(sim.game.window_playable_height))
+    player = sim.game.players[0]
+    assert len(bot.ghost_obstacles(sim.game, player)) == bot.max_ghosts
+
+    # on a clock which doesn't move, the whole horizon is simulated
+    now = [0.0]
+    bot.clock = lambda: now[0]
+    bot.reset()
+    bot.act(sim.game, player)
+    assert bot.depth == bot.horizon and bot.over_budget == 0
+
+    # on a clock moving by a quarter of the budget at each reading, the
+    # copies of the ghosts stop at the deadline, then the search
+    def ticking():
+        now[0] += bot.budget / 4
+        return now[0]
+    bot.clock = ticking
+    assert 0 < len(bot.ghost_obstacles(sim.game, player, bot.budget)) < bot.max_ghosts
+    now[0] = 0.0
+    bot.act(sim.game, player)
+    assert bot.depth == 0 and bot.over_budget == 1
+
+    # slower, the search stops on the way
+    def slow():
+        now[0] += bot.budget / 40
+        return now[0]
+    bot.clock = slow
+    bot.act(sim.game, player)
+    assert 0 < bot.depth < bot.horizon and bot.over_budget == 2
+
+    # the danger bot survives longer than the random one
+    assert survival(DangerFieldBot(3)) > survival(RandomBot(3))
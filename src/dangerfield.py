@@ -0,0 +1,254 @@
+"""
+Danger field module.
+Coarse grid of the danger, from which the DangerFieldBots of a game
+choose the moves of every player at once. Needs NumPy.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import weakref
+
+import numpy
+
+from bots import MOVES
+from env import obstacle_positions
+
+# Direction of each move, in cells
+MOVES_DX = numpy.array([0, 0, -1, 0, 1, -1, 1, -1, 1])
+MOVES_DY = numpy.array([0, -1, 0, 1, 0, -1, -1, 1, 1])
+# Index of the move with the inverted controls
+INVERTED_MOVES = numpy.array([0, 3, 4, 1, 2, 8, 7, 6, 5])
+
+
+class DangerField(object):
+    """
+    Coarse grid of the danger over the playable area, shared by the
+    DangerFieldBots of a game, and computed once per frame.
+    The obstacles are drawn in the grid at their coming positions,
+    extrapolated from their movements, and the bonus items lower the
+    cost around them. Each player then goes towards the neighbour
+    cell whose direction is the cheapest over the next cells: the
+    moves of all the players are chosen at once.
+    """
+
+    # size of the cells, in pixels
+    cell_size = 16
+    # cells looked at in the direction of each move
+    reach = 4
+    # frames after which the obstacles' positions are extrapolated
+    lookahead = (0, 3, 6, 9, 12, 16, 20)
+    # weight of the next position relatively to the previous one
+    decay = 0.8
+    # cost of the cells near the left and right borders
+    border_cost = 4.0
+    # cost of the cells two cells away from the middle of the field
+    off_center_cost = 0.05
+    # gain of a cell holding a bonus item, decreasing with the distance
+    item_attraction = 2.0
+    # distance, in cells, at which the items' attraction halves
+    item_range = 4.0
+
+    # game -> shared field
+    fields = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def of(game: "Game") -> "DangerField":
+        """
+        Returns the field shared by the bots of a game.
+        """
+        field = DangerField.fields.get(game)
+        if field is None:
+            field = DangerField.fields[game] = DangerField(game)
+        return field
+
+    def __init__(self, game: "Game"):
+        self.game = game
+        rect = game.playable_rect
+        cell = self.cell_size
+        self.columns = -(-rect.width // cell)
+        self.rows = -(-rect.height // cell)
+        self.grid = numpy.zeros((self.rows, self.columns))
+        # frame of the chosen moves, and input masks of the players
+        self.frame = None
+        self.masks = numpy.zeros(0, dtype=int)
+        self.indices = {}
+
+        # centers of the cells
+        xs = (numpy.arange(self.columns) + 0.5) * cell
+        ys = (numpy.arange(self.rows) + 0.5) * cell
+        self.xs = xs
+        self.ys = ys
+
+        # the cost which doesn't change: borders and distance to the middle
+        self.base = self.off_center_cost / (2.0 * cell) *\
+            (numpy.abs(xs[None, :] - rect.width / 2.0) + numpy.abs(ys[:, None] - rect.height * 0.75))
+        self.base[:, :2] += self.border_cost
+        self.base[:, -2:] += self.border_cost
+
+        # weights of the extrapolated positions
+        self.weights = numpy.array([self.decay ** i for i in range(len(self.lookahead))])
+
+    def rasterize(self) -> numpy.ndarray:
+        """
+        Computes the cost of the cells from the obstacles and items.
+        """
+        game = self.game
+        cell = self.cell_size
+        grid = self.grid
+        grid[:] = self.base
+
+        obstacles = obstacle_positions(game)
+        if len(obstacles):
+            frames = numpy.array(self.lookahead)
+            # like Rect.move_ip, the moves are truncated to integers
+            x = obstacles[:, 0, None] + numpy.trunc(obstacles[:, 2, None]) * frames
+            y = obstacles[:, 1, None] + numpy.trunc(obstacles[:, 3, None]) * frames
+            weights = numpy.broadcast_to(self.weights, x.shape)
+            columns = numpy.floor(x / cell).astype(int).ravel()
+            rows = numpy.floor(y / cell).astype(int).ravel()
+            inside = (columns >= 0) & (columns < self.columns) & (rows >= 0) & (rows < self.rows)
+            hits = numpy.zeros_like(grid)
+            numpy.add.at(hits, (rows[inside], columns[inside]), weights.ravel()[inside])
+
+            # spread the centers over the area where a player would touch them
+            radius = self.footprint()
+            grid += box_sum(hits, radius)
+
+        items = [item.rect.center for item in game.items if item.bonus and not item.enabled]
+        if items:
+            items = numpy.array(items, dtype=float)
+            dx = (self.xs[None, None, :] - items[:, 0, None, None]) / cell
+            dy = (self.ys[None, :, None] - items[:, 1, None, None]) / cell
+            distance = numpy.sqrt(dx * dx + dy * dy).min(axis=0)
+            grid -= self.item_attraction * self.item_range / (self.item_range + distance)
+
+        return grid
+
+    def footprint(self) -> int:
+        """
+        Returns the radius, in cells, around an obstacle's center
+        where a player's center collides with it.
+        """
+        game = self.game
+        field = game.obstacle_field
+        if field is not None:
+            size = max(field.width, field.height)
+        elif game.obstacles:
+            size = max(game.obstacles[0].rect.size)
+        else:
+            size = 0
+        player = max(game.players[0].rect.size) if game.players else 0
+        return int(numpy.ceil((size + player) / 2.0 / self.cell_size))
+
+    def decide(self) -> numpy.ndarray:
+        """
+        Chooses the input masks of every player for this frame.
+        """
+        game = self.game
+        players = game.players
+        grid = self.rasterize()
+        cell = self.cell_size
+
+        # beyond the field, as costly as the borders
+        padded = numpy.pad(grid, 1, constant_values=grid.max() + self.border_cost)
+        centers = numpy.array([player.rect.center for player in players], dtype=float)\
+            .reshape(-1, 2)
+        columns = numpy.clip(centers[:, 0] // cell, 0, self.columns - 1).astype(int)
+        rows = numpy.clip(centers[:, 1] // cell, 0, self.rows - 1).astype(int)
+
+        # cost of each move: mean cost of the cells in its direction
+        costs = numpy.zeros((len(players), len(MOVES)))
+        for distance in range(1, self.reach + 1):
+            costs += padded[numpy.clip(rows[:, None] + distance * MOVES_DY, -1, self.rows) + 1,
+                            numpy.clip(columns[:, None] + distance * MOVES_DX, -1,
+                                       self.columns) + 1]
+        costs[:, 0] = grid[rows, columns] * self.reach
+        moves = numpy.argmin(costs, axis=1)
+
+        inverted = numpy.array([player.controller.key_up != player.controller.old_key_up
+                                for player in players], dtype=bool)
+        moves = numpy.where(inverted, INVERTED_MOVES[moves], moves)
+        alive = numpy.array([player.alive for player in players], dtype=bool)
+        self.masks = numpy.where(alive, numpy.array(MOVES)[moves], 0)
+        self.indices = {id(player) : i for i, player in enumerate(players)}
+        self.frame = game.frame
+        return self.masks
+
+    def mask(self, player: "Player") -> int:
+        """
+        Returns the input mask of a player, choosing the moves of
+        every player at its first call in a frame.
+        """
+        if self.frame != self.game.frame or id(player) not in self.indices:
+            self.decide()
+        return int(self.masks[self.indices[id(player)]])
+
+
+def box_sum(grid: numpy.ndarray, radius: int) -> numpy.ndarray:
+    """
+    Returns the sums of the grid values over the squares of the
+    given radius around each cell.
+    """
+    if radius <= 0:
+        return grid.copy()
+    rows, columns = grid.shape
+    table = numpy.zeros((rows + 1, columns + 1))
+    table[1:, 1:] = grid.cumsum(axis=0).cumsum(axis=1)
+    top = numpy.clip(numpy.arange(rows) - radius, 0, rows)
+    bottom = numpy.clip(numpy.arange(rows) + radius + 1, 0, rows)
+    left = numpy.clip(numpy.arange(columns) - radius, 0, columns)
+    right = numpy.clip(numpy.arange(columns) + radius + 1, 0, columns)
+    return table[bottom[:, None], right] - table[top[:, None], right] -\
+        table[bottom[:, None], left] + table[top[:, None], left]
+
+
+if __name__ == '__main__':
+
+    from bots import BotSource, DangerFieldBot
+    from simulation import Simulation
+    # the module used by the bots, rather than __main__
+    from dangerfield import DangerField
+
+    # sums over the squares around each cell
+    grid = numpy.zeros((4, 5))
+    grid[0, 0] = 1.0
+    grid[2, 3] = 2.0
+    sums = box_sum(grid, 1)
+    assert sums[1, 1] == 1.0 and sums[1, 2] == 2.0 and sums[3, 4] == 2.0 and sums[3, 0] == 0.0
+    assert (box_sum(grid, 0) == grid).all()
+
+    # dozens of bots in a stress round, the field being computed once per frame
+    sim = Simulation(4, seed=8)
+    game = sim.game
+    game.create_obstacle_field()
+    game.MAXIMUM_OBSTACLE = 200
+    game.nb_of_players = 32
+    game.create_players(32)
+
+    class CountedBot(DangerFieldBot):
+        def act(self, game: "Game", player: "Player") -> int:
+            self.actions += 1
+            return DangerFieldBot.act(self, game, player)
+
+    bots = {}
+    for i, player in enumerate(game.players):
+        # give every player its own keys
+        player.configure_controller(*range(1000 + 4 * i, 1004 + 4 * i))
+        bots[i] = CountedBot(i)
+        bots[i].actions = 0
+    game.input_source = BotSource(game.input_source, bots)
+    positions = [player.rect.topleft for player in game.players]
+    field = DangerField.of(game)
+    decisions = [0]
+    decide = field.decide
+    def counted():
+        decisions[0] += 1
+        return decide()
+    field.decide = counted
+    sim.run(300)
+    assert decisions[0] == game.frame
+    assert all(bot.actions == game.frame for bot in bots.values())
+    assert all(player.rect.topleft != position
+               for player, position in zip(game.players, positions))
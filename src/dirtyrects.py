@@ -0,0 +1,95 @@
+"""
+Dirty rectangles module.
+Keeps track of the screen areas which changed since the last
+frame, so that only them are redrawn and sent to the display.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+from pygame.rect import Rect
+
+
+class DirtyRects(object):
+    """
+    Collects the areas to redraw on a surface.
+    The rects of the drawn actors are tracked each frame: an
+    actor's area is dirty where it was drawn at the last frame and
+    where it is drawn now. When too much of the surface is dirty,
+    the whole surface is redrawn instead.
+    """
+
+    # Part of the surface above which everything is redrawn
+    threshold = 0.5
+    # Number of rects above which everything is redrawn
+    max_rects = 150
+
+    def __init__(self, area: Rect, threshold: float = None):
+        if threshold is not None:
+            self.threshold = threshold
+
+        self.area = Rect(area)
+        # rects of the last frame and of the current one
+        self.previous = []
+        self.current = []
+        # everything must be redrawn
+        self.full = True
+
+    def track(self, rect: Rect) -> None:
+        """
+        Tracks the rect where an actor is drawn this frame.
+        """
+        self.current.append(Rect(rect))
+
+    def invalidate(self) -> None:
+        """
+        Makes the next frame redraw everything.
+        """
+        self.full = True
+
+    def collect(self) -> list:
+        """
+        Returns the rects to redraw this frame, and starts a new frame.
+        """
+        rects = []
+        dirty_area = 0
+        for rect in self.previous + self.current:
+            rect = rect.clip(self.area)
+            if rect.width and rect.height:
+                rects.append(rect)
+                dirty_area += rect.width * rect.height
+
+        self.previous = self.current
+        self.current = []
+
+        if self.full or len(rects) > self.max_rects or\
+            dirty_area > self.threshold * self.area.width * self.area.height:
+            self.full = False
+            return [Rect(self.area)]
+        return rects
+
+
+if __name__ == '__main__':
+
+    dirty = DirtyRects(Rect(0, 0, 100, 100), 0.5)
+
+    # first frame is full
+    dirty.track(Rect(10, 10, 10, 10))
+    assert dirty.collect() == [Rect(0, 0, 100, 100)]
+
+    # old and new positions
+    dirty.track(Rect(15, 10, 10, 10))
+    assert dirty.collect() == [Rect(10, 10, 10, 10), Rect(15, 10, 10, 10)]
+
+    # clipped to the area
+    dirty.track(Rect(-5, 10, 10, 10))
+    assert dirty.collect() == [Rect(15, 10, 10, 10), Rect(0, 10, 5, 10)]
+
+    # too big
+    dirty.track(Rect(0, 0, 80, 80))
+    assert dirty.collect() == [Rect(0, 0, 100, 100)]
+
+    dirty.invalidate()
+    assert dirty.collect() == [Rect(0, 0, 100, 100)]
+    assert dirty.collect() == []
@@ -0,0 +1,155 @@
+"""
+Effects module.
+Lasting effects of the items on the players. An effect adds a
+modifier to a player when it starts and removes it when it ends;
+the player's stats are computed again only then.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+# Stats changed by the modifiers. The speed factors of the effects
+# are multiplied; the controls are inverted while any effect
+# inverts them.
+SPEED = "speed"
+INVERTED = "inverted"
+
+
+class Effects(object):
+    """
+    Modifiers of a player, by source (an item), and the stats
+    they give to the player. The player's speed without effects
+    is old_speed, and its keys without effects are the old_key_*
+    of its controller.
+    """
+
+    def __init__(self, player: "Player"):
+        self.player = player
+        # source -> (stat, value)
+        self.modifiers = {}
+        # stats given by the modifiers
+        self.speed_factor = 1.0
+        self.inverted = False
+
+    def __len__(self) -> int:
+        return len(self.modifiers)
+
+    def add(self, source, stat: str, value) -> None:
+        """
+        Adds the modifier of a source, replacing its previous one.
+        """
+        self.modifiers[source] = (stat, value)
+        self.refresh()
+
+    def remove(self, source) -> None:
+        """
+        Removes the modifier of a source, if any.
+        """
+        if self.modifiers.pop(source, None) is not None:
+            self.refresh()
+
+    def clear(self) -> None:
+        """
+        Removes every modifier.
+        """
+        self.modifiers.clear()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Computes the stats from the modifiers and gives them to
+        the player.
+        """
+        factor = 1.0
+        inverted = False
+        for stat, value in self.modifiers.values():
+            if stat == SPEED:
+                factor *= value
+            elif stat == INVERTED:
+                inverted = inverted or value
+        self.speed_factor = factor
+        self.inverted = inverted
+
+        player = self.player
+        player.speed = player.old_speed * factor
+        controller = player.controller
+        if controller is None:
+            return
+        if inverted:
+            controller.key_up, controller.key_down = controller.old_key_down, controller.old_key_up
+            controller.key_left, controller.key_right = controller.old_key_right,\
+                controller.old_key_left
+        else:
+            controller.key_up, controller.key_down = controller.old_key_up, controller.old_key_down
+            controller.key_left, controller.key_right = controller.old_key_left,\
+                controller.old_key_right
+
+
+if __name__ == '__main__':
+
+    class Controller(object):
+        old_key_up, old_key_left, old_key_down, old_key_right = 1, 2, 3, 4
+        key_up, key_left, key_down, key_right = 1, 2, 3, 4
+
+    class Player(object):
+        old_speed = speed = 4
+        controller = Controller()
+
+    player = Player()
+    effects = Effects(player)
+    a, b, c, d = object(), object(), object(), object()
+
+    # speed factors stack
+    effects.add(a, SPEED, 0.5)
+    effects.add(b, SPEED, 0.5)
+    assert player.speed == 1
+    effects.remove(a)
+    assert player.speed == 2
+
+    # inverted while any inversion is active
+    effects.add(c, INVERTED, True)
+    effects.add(d, INVERTED, True)
+    assert player.controller.key_up == 3 and player.controller.key_left == 4
+    effects.remove(c)
+    assert player.controller.key_up == 3
+    effects.remove(d)
+    effects.remove(d)
+    assert player.controller.key_up == 1 and player.controller.key_right == 4
+
+    effects.clear()
+    assert player.speed == 4 and len(effects) == 0
+
+    # with the game's items
+    from items import Slower, InvertControl
+    from simulation import Simulation
+
+    sim = Simulation(2, seed=1)
+    game = sim.game
+    first, second = game.players
+    for cls in (Slower, Slower, InvertControl):
+        game.start_effect(game.item_pool(cls).acquire(game), first)
+    assert first.speed == 5 and second.speed == 5 / 4.0
+    assert first.controller.key_up == first.controller.old_key_down
+
+    # the stats don't change while the effects last, and come back after
+    sim.run(60)
+    assert second.speed == 5 / 4.0 and len(first.effects) == 1
+    sim.run(60 * 5)
+    assert second.speed == 5 and first.controller.key_up == first.controller.old_key_up
+
+    # the dead players fall slowly
+    second.kill()
+    assert second.speed == 1
+
+    # a copy's effects don't change the player
+    game = Simulation(1, seed=2).game
+    player = game.players[0]
+    game.start_effect(game.item_pool(InvertControl).acquire(game), player)
+    ghost = player.copy()
+    ghost.effects.add(a, SPEED, 0.5)
+    assert ghost.speed == 2.5 and player.speed == 5
+    ghost.kill()
+    assert player.speed == 5 and len(player.effects) == 1 and len(ghost.effects) == 0
+    assert ghost.controller.master is ghost and player.controller.master is player
+    assert player.controller.key_up == player.controller.old_key_down
@@ -7,18 +7,30 @@ Ludum Dare 41
 
 """
 
-import sys
 import os
 import random
 import time
+import hashlib
+import argparse
+import atexit
 
 import pygame
-import pygame.gfxdraw
 
 from actor import Actor
-from player import Player
+from assets import ASSETS
+from player import Player, MAX_COLORS
 from obstacle import Obstacle
-from items import Slower, OneLife, InvertControl
+from spatialhash import SpatialHash
+from pool import ActorPool
+from timers import Timers
+from menu import TitleScreen, PlayerNumberMenu, CommandsScreen, EndBoard
+from dirtyrects import DirtyRects
+from textcache import TextCache
+from profiler import FrameProfiler, NullProfiler
+from replay import ReplayWriter, Replay
+from inputs import KeyboardSource, JoystickSource, MergedSource, ReplaySource
+from latency import LatencyProbe
+from items import Item, Slower, OneLife, InvertControl
 from pygame.font import Font, SysFont
 from pygame.rect import Rect
 from pygame.surface import Surface
@@ -53,8 +65,13 @@ class Game(object):
     # time of last spawn
     obstacles_last_spawn = -1
     obstacles_spawn_rate = 2
+    # spawn rate at the beginning of a round
+    obstacles_start_spawn_rate = 2
     obstacles_max_spawn_rate = 5
     obstacles = []
+    # Alternative NumPy obstacle engine, used instead of the obstacles
+    # list when created (see create_obstacle_field)
+    obstacle_field = None
 
     # Items
     item_spawn_rate = 0.1
@@ -64,16 +81,98 @@ class Game(object):
     item_last_spawn = -1
     items = []
     activated_items = []
+    # end of the items' lifetimes and of their effects (see timers.py)
+    item_timeouts = None
+    effect_timeouts = None
+
+    # Pools of the actors which left the field, reused by the spawns
+    obstacle_pool = None
+    # item class -> pool
+    item_pools = None
+
+    # Collision broadphase, rebuilt every frame
+    broadphase = None
+    broadphase_cell_size = 64
+
+    # Pixel perfect collisions: the actors collide with the solid
+    # pixels of their sprites instead of their hitboxes
+    pixel_collisions = False
+
+    # Seats taken by bots after the human players, to fill the
+    # empty seats of a cabinet (see bots.py)
+    bot_seats = 0
+    MAXIMUM_PLAYERS = 4
 
     # clock for FPS fix
     CLOCK = pygame.time.Clock()
     FPS = 60
 
+    # simulation time
+    # With a fixed timestep, the game time advances of 1/FPS s per
+    # update instead of following the wall clock
+    fixed_timestep = False
+    sim_time = 0.0
+    # number of updates since the beginning of the round
+    frame = 0
+
+    # Random numbers generator, seeded at each round.
+    # All the random decisions of the game must use it.
+    rng = None
+    # seed of the rounds, a random one is used if None
+    seed = None
+
+    # Path of the replay file of the rounds, no replay is recorded if None
+    record_path = None
+
+    # Headless games don't process the window events nor draw
+    headless = False
+    # Source of the players' inputs, sampled once per frame into
+    # one mask per player (see inputs.py)
+    input_source = None
+    input_masks = []
+    # Writer of the replay of the round being recorded
+    replay_writer = None
+
+    # Rendering: the simulation runs FPS ticks per second whatever
+    # the display rate. Frames per second of the display, the
+    # simulation's FPS if None, unlimited if 0
+    render_rate = None
+    # The actors are drawn between their positions of the last two
+    # ticks, so that the motion is smooth at any display rate
+    interpolation = True
+    # Moves longer than this in one tick are not interpolated (the
+    # background going back to its start)
+    teleport_distance = 100
+    # Maximum ticks computed per displayed frame; beyond, a too slow
+    # machine slows the game down
+    max_ticks_per_frame = 5
+    # position of the last frame between the ticks, 1 at the last tick
+    draw_alpha = 1.0
+
+    # Input lag measures, see latency.py
+    latency = None
+    # events read while waiting for the next frame, and end of the wait
+    received_events = None
+    last_tick = None
+
     # background related
     sep = os.path.sep
     background = None
     background_scroll = 1 # speed
 
+    # Dirty rendering: only the areas which changed are redrawn
+    # and sent to the display
+    dirty_rendering = False
+    # part of the playfield above which everything is redrawn
+    dirty_threshold = 0.5
+    dirty_rects = None
+    # HUD state of the last drawn frame
+    last_hud_state = None
+    last_background_y = None
+
+    # Frame phases profiler, does nothing unless a FrameProfiler is set
+    profiler = NullProfiler()
+
     # HUD related
     hud_font = "System Bold"
     # default font size
@@ -89,19 +188,29 @@ class Game(object):
 
     """ CREATION / INIT METHODS """
 
-    def __init__(self):
+    def __init__(self, seed: int = None):
         """
         Create game. 2 players are default but
         you can choose a bigger number. The number
         of player must be >= 2.
+        With a seed, the rounds are reproducible.
         """
 
+        self.seed = seed
+        self.rng = random.Random(seed)
+
         self.init_pygame_modules()
         self.create_window(self.window_width, self.window_height)
         self.create_players(2)
+        self.create_broadphase()
+        self.create_pools()
+        self.create_timers()
+        self.input_source = KeyboardSource()
+        self.received_events = []
         self.create_fonts()
         self.create_images()
         self.load_sfx()
+        self.reset_round()
 
     def init_pygame_modules(self):
         """
@@ -200,6 +309,76 @@ class Game(object):
                 pygame.K_KP6
             )
 
+    def create_broadphase(self) -> None:
+        """
+        Creates the grid used to find the collision candidates.
+        """
+        self.broadphase = SpatialHash(self.playable_rect, self.broadphase_cell_size)
+
+    def create_pools(self) -> None:
+        """
+        Creates the pools of the obstacles and of the items.
+        """
+        self.obstacle_pool = ActorPool(Obstacle)
+        self.item_pools = {cls : ActorPool(cls) for cls in (Slower, OneLife, InvertControl)}
+
+    def create_timers(self) -> None:
+        """
+        Creates the timers of the items.
+        """
+        self.item_timeouts = Timers()
+        self.effect_timeouts = Timers()
+
+    def schedule_items(self) -> None:
+        """
+        Schedules again the timers of every item, after the items
+        were changed without the game (see snapshot.py).
+        """
+        self.item_timeouts.clear()
+        self.effect_timeouts.clear()
+        for item in self.items:
+            Timers.cancel(item)
+            self.item_timeouts.schedule(item.time_alive_start + item.time_alive, item)
+        for item in self.activated_items:
+            Timers.cancel(item)
+            self.effect_timeouts.schedule(item.start + item.duration, item)
+
+    def item_pool(self, cls: type) -> ActorPool:
+        """
+        Returns the pool of an item class.
+        """
+        pool = self.item_pools.get(cls)
+        if pool is None:
+            pool = ActorPool(cls)
+            self.item_pools[cls] = pool
+        return pool
+
+    def release_item(self, item: Item) -> None:
+        """
+        Gives back an item which left the game to its pool.
+        """
+        Timers.cancel(item)
+        self.item_pool(type(item)).release(item)
+
+    def gauge_pools(self) -> None:
+        """
+        Sends the pools' sizes and high-water marks to the profiler.
+        """
+        pools = [("obstacles", self.obstacle_pool)]
+        pools += [(cls.__name__.lower(), pool) for cls, pool in self.item_pools.items()]
+        for name, pool in pools:
+            self.profiler.gauge("pool_{}_size".format(name), pool.size())
+            self.profiler.gauge("pool_{}_high".format(name), pool.high_water)
+
+    def create_obstacle_field(self) -> None:
+        """
+        Switches to the NumPy obstacle engine, made for a huge
+        number of obstacles. NumPy is only needed for this engine.
+        """
+        from obstaclefield import ObstacleField
+        self.obstacles = []
+        self.obstacle_field = ObstacleField(self)
+
     def create_fonts(self) -> None:
         """
         Creates the fonts.
@@ -209,19 +388,31 @@ class Game(object):
         self.name_font = pygame.font.SysFont(self.hud_font, 25)
         self.live_font = pygame.font.SysFont(self.hud_font, 20)
 
+        # fonts created on demand, by size
+        self.sized_fonts = {}
+        self.text_cache = TextCache()
+
     def create_images(self) -> None:
         """
         Creates the images and store them.
         """
-        self.background_img = pygame.image.load("resources" + self.sep + "background.png")
-        self.heart_icon = pygame.image.load("resources" + self.sep + "heart.png")
-        self.life_item_img = pygame.image.load("resources" + self.sep + "items" + self.sep +\
-         "life.png")
-        self.slower_item_img = pygame.image.load("resources" + self.sep + "items" + self.sep +\
-         "slower.png")
-        self.invert_item_img = pygame.image.load("resources" + self.sep + "items" + self.sep +\
-         "invert_control.png")
-        self.greeter = pygame.image.load("resources" + self.sep + "greeter.png")
+        self.background_img = ASSETS.image("background.png")
+        self.heart_icon = ASSETS.image("heart.png")
+        self.life_item_img = ASSETS.image(*OneLife.sprite)
+        self.slower_item_img = ASSETS.image(*Slower.sprite)
+        self.invert_item_img = ASSETS.image(*InvertControl.sprite)
+        self.greeter = ASSETS.image("greeter.png")
+        self.obstacle_img = ASSETS.image(*Obstacle.sprite_intact_path)
+
+        # Load the actors' sprites now, so that spawning never reads the disk
+        ASSETS.preload([Obstacle.sprite_destroyed_path])
+        ASSETS.preload([("player_{}_{}.png".format(pid, pose),)
+                        for pid in range(1, MAX_COLORS + 1)
+                        for pose in ("idle", "left", "right")])
+
+        # Pre-rotate the spinning sprites
+        Actor.rotation_cache.build(self.obstacle_img)
+        Actor.rotation_cache.build(ASSETS.image(*Obstacle.sprite_destroyed_path))
 
     def load_sfx(self) -> None:
         """
@@ -236,6 +427,142 @@ class Game(object):
             "invert_control" : pygame.mixer.Sound(root + "invert_control.wav")
         }
 
+    def reset_round(self) -> None:
+        """
+        Clears the field, the scores and the timers before a new round.
+        """
+        self.rng.seed(self.seed)
+
+        self.obstacle_pool.release_all(self.obstacles)
+        self.obstacles = []
+        if self.obstacle_field is not None:
+            self.create_obstacle_field()
+        for item in self.items + self.activated_items:
+            self.release_item(item)
+        self.items = []
+        self.activated_items = []
+        self.item_timeouts.clear()
+        self.effect_timeouts.clear()
+        for player in self.players:
+            player.effects.clear()
+
+        self.avoided = 0
+        self.end_time = 0
+        self.frame = 0
+        self.sim_time = 0.0
+        self.obstacles_last_spawn = -1
+        self.obstacles_spawn_rate = self.obstacles_start_spawn_rate
+        self.item_last_spawn = -1
+
+        self.background = Actor(self, self.background_img, 0, self.window_playable_height - 1)
+
+    """ TIME AND INPUTS """
+
+    def now(self) -> float:
+        """
+        Returns the current game time, in seconds.
+        """
+        if self.fixed_timestep:
+            return self.sim_time
+        return time.time()
+
+    def state_digest(self) -> str:
+        """
+        Returns a digest of the game state. Two games with the
+        same seed and the same inputs have the same digests.
+        """
+        state = [self.frame, self.avoided, self.obstacles_spawn_rate]
+        for player in self.players:
+            state.append((tuple(player.rect), player.lifes, player.alive, player.score))
+        for obstacle in self.obstacles:
+            state.append((tuple(obstacle.rect), obstacle.rotation, obstacle.destroyed))
+        if self.obstacle_field is not None:
+            n = len(self.obstacle_field)
+            state.append(self.obstacle_field.x[:n].tobytes())
+            state.append(self.obstacle_field.y[:n].tobytes())
+            state.append(self.obstacle_field.destroyed[:n].tobytes())
+        for item in self.items + self.activated_items:
+            state.append((type(item).__name__, tuple(item.rect), item.enabled))
+        return hashlib.sha1(repr(state).encode()).hexdigest()
+
+    def sample_inputs(self) -> None:
+        """
+        Samples the players' inputs of the frame, and records them
+        if the round is recorded.
+        """
+        self.input_masks = self.input_source.sample(self)
+        if self.replay_writer is not None:
+            self.replay_writer.record_frame(self.input_masks)
+        if self.latency is not None:
+            self.latency.sample()
+
+    def wait_next_frame(self) -> None:
+        """
+        Waits for the next frame. When the latency is measured, the
+        events are read as they come during the wait, so that they
+        are timestamped, and handled by the next update.
+        """
+        rate = self.FPS if self.render_rate is None else self.render_rate
+        if self.latency is None:
+            self.CLOCK.tick(rate)
+            return
+
+        now = time.perf_counter()
+        deadline = now if self.last_tick is None or not rate else\
+            max(now, self.last_tick + 1.0 / rate)
+        while now < deadline:
+            event = pygame.event.wait(max(1, int((deadline - now) * 1000)))
+            if event.type != pygame.NOEVENT:
+                self.latency.event(event)
+                self.received_events.append(event)
+            now = time.perf_counter()
+        self.last_tick = now
+        self.CLOCK.tick()
+
+    def moving_actors(self) -> "list of Actor":
+        """
+        Returns the actors whose drawn positions are interpolated.
+        """
+        return [self.background] + self.players + self.obstacles + self.items
+
+    def store_positions(self) -> None:
+        """
+        Stores the actors' positions before a simulation tick.
+        """
+        frame = self.frame
+        for actor in self.moving_actors():
+            actor.previous_position = (frame, actor.rect.x, actor.rect.y)
+
+    def interpolate(self, alpha: float) -> list:
+        """
+        Moves the actors between their positions before and after
+        the last tick, alpha = 0 being the position before. Returns
+        the moved actors and their true positions.
+        """
+        moved = []
+        frame = self.frame - 1
+        for actor in self.moving_actors():
+            previous = actor.previous_position
+            # the actors which appeared during the tick stay still
+            if previous is None or previous[0] != frame:
+                continue
+            x, y = actor.rect.x, actor.rect.y
+            dx = x - previous[1]
+            dy = y - previous[2]
+            if (dx or dy) and abs(dx) <= self.teleport_distance and\
+               abs(dy) <= self.teleport_distance:
+                moved.append((actor, x, y))
+                actor.rect.x = int(round(previous[1] + dx * alpha))
+                actor.rect.y = int(round(previous[2] + dy * alpha))
+        return moved
+
+    def frame_presented(self) -> None:
+        """
+        Called after each display update.
+        """
+        if self.latency is not None:
+            self.latency.present()
+
     """ SPAWN AND DESTROY METHODS """
 
     def maximum_obstacle_spawned(self) -> bool:
@@ -243,20 +570,34 @@ class Game(object):
         Indicate whether the maximum number of spawned
         obstacles has been reached.
         """
-        return len(self.obstacles) == self.MAXIMUM_OBSTACLE
+        return self.obstacle_count() >= self.MAXIMUM_OBSTACLE
+
+    def obstacle_count(self) -> int:
+        """
+        Returns the number of obstacles on the field.
+        """
+        if self.obstacle_field is not None:
+            return len(self.obstacle_field)
+        return len(self.obstacles)
 
     def create_obstacle(self, avoided: int = 0):
         """
         Makes an obstacle spot randomly.
         """
         if not self.maximum_obstacle_spawned():
-            self.obstacles.append(Obstacle(self, random.randrange(0, self.window_playable_width),
-                -Obstacle.img.get_rect().height))
             if avoided > 10: 
                 avoided = 10
-            self.obstacles[-1].speed += (avoided * Obstacle.speed / 20.0)
+            x_pos = self.rng.randrange(0, self.window_playable_width)
+            y_pos = -self.obstacle_img.get_rect().height
+            speed = Obstacle.speed + (avoided * Obstacle.speed / 20.0)
+            if self.obstacle_field is not None:
+                self.obstacle_field.spawn(x_pos, y_pos, speed)
+            else:
+                obstacle = self.obstacle_pool.acquire(self, x_pos, y_pos)
+                obstacle.speed = speed
+                self.obstacles.append(obstacle)
             # start timelaps
-            self.obstacles_last_spawn = time.time()
+            self.obstacles_last_spawn = self.now()
 
     def random_spawn_item(self) -> None:
         """
@@ -270,16 +611,16 @@ class Game(object):
         # part 2 has 20% of spawn
         # else it's spawn in part 3 (5%)
 
-        rand = random.randint(0, 100)
-        x_pos = random.randrange(0, self.window_playable_width - Obstacle.img.get_rect().width)
-        y_pos = random.randint(0, 4) / 4.0
+        rand = self.rng.randint(0, 100)
+        x_pos = self.rng.randrange(0, self.window_playable_width - self.obstacle_img.get_rect().width)
+        y_pos = self.rng.randint(0, 4) / 4.0
 
         # choose item to be spawn
         item_classes = [Slower, OneLife, InvertControl]
         if self.nb_of_players > 1:
-            rand_class = random.randint(0, 2)
+            rand_class = self.rng.randint(0, 2)
         else:
-            rand_class = random.randint(1, 2)
+            rand_class = self.rng.randint(1, 2)
         
         part0 = 50
         part1 = 25
@@ -302,15 +643,20 @@ class Game(object):
             y_pos = (y_pos * part_height) + 3 * part_height
 
         # start timelaps
-        self.item_last_spawn = time.time()
+        self.item_last_spawn = self.now()
         
-        self.items.append(item_classes[rand_class](self, x_pos, y_pos))
+        item = self.item_pool(item_classes[rand_class]).acquire(self, x_pos, y_pos)
+        self.items.append(item)
+        self.item_timeouts.schedule(item.time_alive_start + item.time_alive, item)
         
     def delete_obstacles_far_away(self) -> int:
         """
         Delete the obstacles which have left the screen. 
         Returns the number of deleted obstacles
         """
+        if self.obstacle_field is not None:
+            return self.obstacle_field.cull(self.window_playable_width,
+                                            self.window_playable_height)
         i = 0
         deleted = 0
         for obstacle in self.obstacles:
@@ -318,6 +664,7 @@ class Game(object):
                 obstacle.rect.x + obstacle.rect.width < 0 or\
                 obstacle.rect.x > self.window_playable_width:
                 del self.obstacles[i]
+                self.obstacle_pool.release(obstacle)
                 deleted += 1
             i += 1
         return deleted
@@ -328,32 +675,73 @@ class Game(object):
         """
         Checks players' inputs and call associated methods.
         """
+        masks = self.input_masks
         for i in range(self.nb_of_players):
             # Make the players move
             player = self.players[i]
 
             if player.is_alive():
-                player.make_action()
+                player.make_action(masks[i] if i < len(masks) else 0)
             else:
                 player.move(3)
 
     def process_activated_items(self) -> None:
         """
-        Applies the activated items' effects on the players.
+        Removes the items whose effect is over.
         """
-        i = 0
-        while i < len(self.activated_items):
-            item = self.activated_items[i]
-            self.players = item.apply(self.players)
-            if item.times_up():
-                del self.activated_items[i]
-                i -= 1
-            i += 1
+        for item in self.effect_timeouts.expired(self.now()):
+            self.activated_items.remove(item)
+            self.end_effect(item)
+            self.release_item(item)
+
+    def start_effect(self, item: Item, activator: Player) -> None:
+        """
+        Activates an item: applies its instant effect and gives its
+        modifiers to the living players until its effect ends.
+        """
+        self.activated_items.append(item)
+        item.activate(activator)
+        self.players = item.apply(self.players)
+        self.add_modifiers(item)
+        # the lifetime's timer is replaced by the effect's one
+        Timers.cancel(item)
+        self.effect_timeouts.schedule(item.start + item.duration, item)
+
+    def add_modifiers(self, item: Item) -> None:
+        """
+        Gives the modifiers of an activated item to the living players.
+        """
+        for player in self.players:
+            if player.is_alive():
+                modifier = item.modifier(player)
+                if modifier is not None:
+                    player.effects.add(item, *modifier)
+
+    def end_effect(self, item: Item) -> None:
+        """
+        Removes the modifiers of an item from the players.
+        """
+        for player in self.players:
+            player.effects.remove(item)
+
+    def restore_effects(self) -> None:
+        """
+        Gives again the modifiers of every activated item, after the
+        items were changed without the game (see snapshot.py).
+        """
+        for player in self.players:
+            player.effects.modifiers.clear()
+        for item in self.activated_items:
+            self.add_modifiers(item)
+        for player in self.players:
+            player.effects.refresh()
 
     def process_obstacles_movements(self) -> None:
         """
         Makes the obstacles move downward.
         """
+        if self.obstacle_field is not None:
+            self.obstacle_field.move()
         for obstacle in self.obstacles:
             obstacle.rotate(obstacle.rotating_speed)
             obstacle.move()
@@ -362,15 +750,9 @@ class Game(object):
         """
         Destroy items if their live duration is reached.
         """
-        destroyed = True
-        while destroyed:
-            destroyed = False
-            for i in range(len(self.items)):
-                item = self.items[i]
-                if time.time() - item.time_alive_start >= item.time_alive:
-                    del self.items[i]
-                    destroyed = True
-                    break
+        for item in self.item_timeouts.expired(self.now()):
+            self.items.remove(item)
+            self.release_item(item)
 
     """ COLLISION DETECTIONS """
 
@@ -388,16 +770,41 @@ class Game(object):
         else:
             return (False, False)
 
-    def detect_collisions_with_players(self, player) -> bool:
+    def detect_collisions_with_players(self, player, candidates: list = None) -> bool:
         """
         Indicates whether the player collides with another player.
+        The players to test can be given, by default every player
+        is tested.
         """
-        for player2 in self.players:
-            if player != player2:
+        if candidates is None:
+            candidates = self.players
+        for player2 in candidates:
+            if player != player2 and isinstance(player2, Player):
                 if player.detect_collision(player2):
                     return True
         return False
 
+    def fill_broadphase(self) -> None:
+        """
+        Inserts the players, the items and the obstacles in the
+        broadphase grid.
+        """
+        self.broadphase.clear()
+
+        # The pixel perfect collisions use the whole sprites
+        box = "rect" if self.pixel_collisions else "aabb"
+
+        for player in self.players:
+            if player.can_collide:
+                # players move during the collision checks, keep a margin
+                margin = 2 * int(player.speed + 1)
+                self.broadphase.insert(player, getattr(player, box).inflate(margin, margin))
+        for item in self.items:
+            self.broadphase.insert(item, getattr(item, box))
+        for obstacle in self.obstacles:
+            if obstacle.can_collide:
+                self.broadphase.insert(obstacle, getattr(obstacle, box))
+
     """ PLAYERS INFO """
 
     def still_alive(self) -> (bool, ...):
@@ -472,6 +879,8 @@ class Game(object):
         """
         Draws the obstacles.
         """
+        if self.obstacle_field is not None:
+            self.obstacle_field.draw(self.window_playable, self.draw_alpha)
         for obstacle in self.obstacles:
             obstacle.draw(self.window_playable)
 
@@ -545,26 +954,25 @@ class Game(object):
         Draws all hud elements
         """
         # clear
-        clear = Surface((self.window_width, self.window_height - self.window_playable_height))
-        clear.fill((0, 0, 0))
-        self.window.blit(clear, (0, self.window_playable_height))
+        self.window.fill((0, 0, 0), self.hud_rect())
         self.draw_names()
         self.draw_lifes()
         self.draw_effects()
 
-    """ ITEM EFFECTS BACK UPS """
+    def hud_rect(self) -> Rect:
+        """
+        Returns the area of the window used by the hud.
+        """
+        return Rect(0, self.window_playable_height, self.window_width,
+                    self.window_height - self.window_playable_height)
 
-    def restore_players_backup(self) -> None:
+    def hud_state(self) -> tuple:
         """
-        Restores the players variables that are affected
-        by items.
+        Returns the values displayed by the hud.
         """
-        for player in self.players:
-            player.speed = player.old_speed
-            player.controller.key_up = player.controller.old_key_up
-            player.controller.key_down = player.controller.old_key_down
-            player.controller.key_left = player.controller.old_key_left
-            player.controller.key_right = player.controller.old_key_right
+        effects = tuple((type(item), self.players.index(item.activator))
+                        for item in self.activated_items if item.activator in self.players)
+        return (self.nb_of_players, tuple(player.lifes for player in self.players), effects)
 
     """ GAME LOOP """
 
@@ -575,23 +983,53 @@ class Game(object):
         """
 
         end = False
+        profiler = self.profiler
+
+        # A keyframe of the replay holds the state before the frame
+        if self.replay_writer is not None:
+            self.replay_writer.begin_frame()
+
+        # Advance the game time
+        self.frame += 1
+        if self.fixed_timestep:
+            self.sim_time += 1.0 / self.FPS
 
         # Process window events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                end = True
+        if not self.headless:
+            events = pygame.event.get()
+            if self.latency is not None:
+                for event in events:
+                    self.latency.event(event)
+                # with the ones received during the wait
+                events = self.received_events + events
+                self.received_events = []
+            for event in events:
+                if event.type == pygame.QUIT:
+                    end = True
+        profiler.mark("events")
 
         # Process activated items effects
         self.process_activated_items()
+        profiler.mark("activated_items")
 
         # destroy items if timeout
         self.process_item_timeouts()
+        profiler.mark("item_timeouts")
+
+        # Sample the inputs once, as late as possible before the moves
+        self.sample_inputs()
+        profiler.mark("inputs")
 
         # Process players input (moves)
         self.process_players_inputs()
+        profiler.mark("players_inputs")
 
         # Process obstacles movements (falling)
         self.process_obstacles_movements()
+        profiler.mark("obstacles_movements")
+
+        # Find the actors close to each other
+        self.fill_broadphase()
 
         # If one of the player collided with an obstacle or a border
         for p_idx in range(self.nb_of_players):
@@ -608,43 +1046,57 @@ class Game(object):
                 if player.is_alive():
                     player.rect.clamp_ip(self.window_playable.get_rect())
 
+            if not player.can_collide:
+                continue
+
+            candidates = self.broadphase.query(player.rect if self.pixel_collisions
+                                               else player.aabb)
+
             # If the player collides with another one, cancel last action
             # NOTE : this feature is broken because we don't check the responsible
             # of the collision, hence, one player will "vibrate" when other players
             # collide with him, because the order of detection is always the same.
-            if self.detect_collisions_with_players(player):
+            if self.detect_collisions_with_players(player, candidates):
                 player.cancel_action()
             
-            # If a player collides with an item, activate it
-            i = 0
-            while i < len(self.items):
-                item = self.items[i]
-                if player.detect_collision(item):
-                    self.activated_items.append(item)
-                    item.activate(player)
-                    del self.items[i]
-                    i -= 1
-                    self.sfx["slower"].play()
-                i += 1
-
-            # If the player collides with an asteroid, he loses a life and the asteroid
-            # is broken into pieces
-            for obstacle in self.obstacles:
-                if player.detect_collision(obstacle):
-                    obstacle.destroy()
+            for actor in candidates:
+                # If a player collides with an item, activate it
+                if isinstance(actor, Item):
+                    if not actor.enabled and player.detect_collision(actor):
+                        self.items.remove(actor)
+                        self.start_effect(actor, player)
+                        self.sfx["slower"].play()
+
+                # If the player collides with an asteroid, he loses a life and the asteroid
+                # is broken into pieces
+                elif isinstance(actor, Obstacle):
+                    if player.detect_collision(actor):
+                        actor.destroy()
+                        player.hurt()
+                        self.sfx["crash"].play()
+
+            # Same with the obstacle field, tested all at once
+            if self.obstacle_field is not None:
+                if self.pixel_collisions:
+                    hits = self.obstacle_field.collide_pixels(player.image, player.rect.topleft)
+                else:
+                    hits = self.obstacle_field.collide(player.hitboxes)
+                for obstacle in hits:
+                    if not player.can_collide:
+                        break
+                    self.obstacle_field.destroy(obstacle)
                     player.hurt()
                     self.sfx["crash"].play()
 
-        # Cancel item effects
-        self.restore_players_backup()
+        profiler.mark("collisions")
 
         # If no player still remains, end
         if not any(self.still_alive()):
             end = True
 
         # Spawns with increasing frequence over time
-        if time.time() - self.obstacles_last_spawn >= self.obstacles_spawn_laps:
-            if random.randrange(0, int(self.FPS / self.obstacles_spawn_rate)) == 0:
+        if self.now() - self.obstacles_last_spawn >= self.obstacles_spawn_laps:
+            if self.rng.randrange(0, int(self.FPS / self.obstacles_spawn_rate)) == 0:
                 self.create_obstacle(self.avoided)
         # increase obstacle spawn rate
         self.obstacles_spawn_rate += (self.avoided / 20.0 * self.obstacles_spawn_rate)
@@ -652,8 +1104,8 @@ class Game(object):
             self.obstacles_spawn_rate = self.obstacles_max_spawn_rate
 
         # Spawn an item
-        if time.time() - self.item_last_spawn >= self.item_spawn_laps:
-            if random.randrange(0, (self.FPS / self.item_spawn_rate)) == 0:
+        if self.now() - self.item_last_spawn >= self.item_spawn_laps:
+            if self.rng.randrange(0, int(self.FPS / self.item_spawn_rate)) == 0:
                 self.random_spawn_item()
 
         # delete the obstacles which have left the screen
@@ -663,278 +1115,280 @@ class Game(object):
         self.background.rect.y += self.background_scroll
         if self.background.rect.y >= 0:
             self.background.rect.bottomleft = (0, self.window_playable_height - 1)
+        profiler.mark("spawning")
+
+        if profiler.enabled:
+            self.gauge_pools()
 
         return end
 
-    def draw(self) -> None:
+    def draw(self, alpha: float = 1.0) -> None:
         """
-        Draw everything.
+        Draw everything, alpha (between 0 and 1) ticks after the
+        previous tick.
+        """
+        self.draw_alpha = alpha
+        moved = self.interpolate(alpha) if alpha < 1.0 else []
+
+        if self.dirty_rendering:
+            self.draw_dirty()
+        else:
+            self.draw_full()
+
+        # back to the simulated positions
+        for actor, x, y in moved:
+            actor.rect.x = x
+            actor.rect.y = y
+        self.draw_alpha = 1.0
+
+    def draw_full(self) -> None:
         """
+        Draws the whole window.
+        """
+        profiler = self.profiler
+
         self.draw_background()
+        profiler.mark("draw_background")
         self.draw_players()
+        profiler.mark("draw_players")
         self.draw_items()
+        profiler.mark("draw_items")
         self.draw_obstacles()
+        profiler.mark("draw_obstacles")
 
         self.draw_hud()
+        profiler.mark("draw_hud")
 
         self.window.blit(self.window_playable, (0, 0))
+        self.draw_profiler()
+        profiler.mark("draw_compose")
         pygame.display.update()
+        self.frame_presented()
+        profiler.mark("display_update")
 
-    def game_loop(self) -> None:
+    def draw_profiler(self) -> None:
         """
-        The game loop.
+        Draws the profiler overlay, if enabled.
         """
+        if self.profiler.overlay:
+            self.profiler.draw_overlay(self.window, self.live_font)
 
-        end = False
-        self.background = Actor(self, self.background_img, 0, self.window_playable_height - 1)
-
-        while not end:
-
-            # Process inputs, detect collisions and spawn things
-            game_end = self.update()
-
-            if game_end and self.end_time == 0:
-                self.end_time = time.time()
-
-            if game_end and time.time() - self.end_time >= self.endlaps:
-                end = True
-
-            # Draw everything
-            self.draw()
-
-            # Tick
-            self.CLOCK.tick(self.FPS) # 60 FPS
-
-    """ HUD """
+    def invalidate_drawing(self) -> None:
+        """
+        Makes the next dirty rendering frame redraw everything,
+        i.e. after a menu was displayed.
+        """
+        if self.dirty_rects is not None:
+            self.dirty_rects.invalidate()
+        self.last_hud_state = None
 
-    def message(self, message: str, x_pos: int, y_pos: int, font: Font = None, 
-                fontsize: int = None, color=WHITE) -> None:
+    def draw_dirty(self) -> None:
         """
-        Display a message for the next frame.
+        Draws only what changed since the last frame: the old and
+        new areas of the actors, and the hud if its values changed.
+        Everything is redrawn when the background scrolled or when
+        too much of the playfield changed.
         """
-        if font is None:
-            font = pygame.font.SysFont(self.hud_font, 
-                self.FONTSIZE if fontsize is None else fontsize)
+        if self.dirty_rects is None:
+            self.dirty_rects = DirtyRects(self.window_playable.get_rect(),
+                                          self.dirty_threshold)
+        dirty = self.dirty_rects
 
-        text = font.render(message, True, color)
+        background = self.background
+        if background.rect.y != self.last_background_y:
+            self.last_background_y = background.rect.y
+            dirty.invalidate()
 
-        self.window.blit(text, (x_pos, y_pos))
+        for actor in self.players + self.items + self.obstacles:
+            dirty.track(actor.rect)
+        if self.obstacle_field is not None:
+            for rect in self.obstacle_field.rects(self.draw_alpha):
+                dirty.track(rect)
 
-    def title_screen(self) -> None:
-        """
-        Display the title screen and wait for input.
-        """
-        end = False
+        rects = dirty.collect()
+        profiler = self.profiler
+        profiler.mark("dirty_rects")
 
-        asteroids = []
-        for i in range(5):
-            asteroids.append(Obstacle(self, self.window_width + random.randint(10, 100),
-                random.randint(150, 300)))
-            asteroids[-1].speed = random.randint(1, 30) / 10.0
-            asteroids[-1].rotating_speed = random.randint(-3, 3)
-            asteroids[-1].move_x = random.randint(-3, -1)
+        # restore the background under the dirty areas
+        for rect in rects:
+            self.window_playable.blit(background.image, rect.topleft,
+                                      rect.move(-background.rect.x, -background.rect.y))
+        profiler.mark("draw_background")
 
-        while not end:
+        self.draw_players()
+        profiler.mark("draw_players")
+        self.draw_items()
+        profiler.mark("draw_items")
+        self.draw_obstacles()
+        profiler.mark("draw_obstacles")
 
-            self.window.blit(self.greeter, (0, 0))
-            self.message("Save Your Assteroid", 35, 150, self.menu_font)
-            self.message("Press a key", 140, 200, self.sub_menu_font)
+        for rect in rects:
+            self.window.blit(self.window_playable, rect.topleft, rect)
 
-            for ast in asteroids:
-                if ast.rect.x + ast.rect.width < 0:
-                    ast.rect.x = random.randint(10, 100) + self.window_width
-                    ast.rect.y = random.randint(150, 300)
-                ast.move()
-                ast.rotate(ast.rotating_speed)
-                ast.draw(self.window)
+        hud_state = self.hud_state()
+        if hud_state != self.last_hud_state:
+            self.last_hud_state = hud_state
+            self.draw_hud()
+            rects.append(self.hud_rect())
+        profiler.mark("draw_hud")
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit(0)
-                elif event.type == pygame.KEYDOWN:
-                    end = True
-                    self.sfx["confirm"].play()
+        if self.profiler.overlay:
+            self.draw_profiler()
+            rects.append(self.profiler.overlay_surface.get_rect())
+            # the overlay covers the playfield
+            dirty.invalidate()
+        profiler.mark("draw_compose")
 
-            pygame.display.update()
-            self.CLOCK.tick(self.FPS)
+        if rects:
+            pygame.display.update(rects)
+            self.frame_presented()
+        profiler.mark("display_update")
 
-    def ask_number_of_player(self) -> int:
+    def game_loop(self, record: str = None) -> None:
         """
-        Ask the player the number of players to
-        play with. Returns this number
+        The game loop.
+        The simulation runs on a fixed timestep, whatever the display
+        rate: each displayed frame computes the ticks of the elapsed
+        time, then draws the actors between the last two ticks.
+        If a path is given, the round is recorded in a replay file.
         """
-        number = 1
-        n_min = 1
-        n_max = 4
-        grey = (70, 70, 70)
 
         end = False
-        while not end:
-            self.window.fill((0, 0, 0))
-            self.message("Choose the number of players", 50, 100, self.sub_menu_font)
-
-            x_center = self.window_width / 2 - 20
-            y_center = self.window_height / 2 - 20
 
-            x_delta = 15
-            y_delta = 5
+        self.invalidate_drawing()
 
-            tri_width = 50
-            tri_height = 30
-            y_padding = 30
+        # the game time advances of one tick per update
+        self.fixed_timestep = True
+        writer = None
+        if record is not None:
+            writer = ReplayWriter(record, self)
+        self.replay_writer = writer
 
-            up_triangle = ((x_center - x_delta, y_center - y_delta), 
-                (x_center - x_delta + tri_width, y_center - y_delta), 
-                (x_center - x_delta + tri_width / 2, y_center - y_delta - tri_height))
+        tick = 1.0 / self.FPS
+        # time not simulated yet
+        lag = 0.0
+        previous = time.perf_counter()
 
-            down_triangle = ((x_center - x_delta, y_center + y_delta + y_padding), 
-                (x_center - x_delta + tri_width, y_center + y_delta + y_padding), 
-                (x_center - x_delta + tri_width / 2, 
-                    y_center + y_delta + tri_height + y_padding))
+        while not end:
 
-            up_color = self.WHITE if number < n_max else grey
-            down_color = self.WHITE if number > n_min else grey
+            self.profiler.start_frame()
 
-            pygame.draw.polygon(self.window, up_color, up_triangle)
-            pygame.gfxdraw.aapolygon(self.window, up_triangle, up_color)
+            # Simulate the elapsed time, tick by tick
+            now = time.perf_counter()
+            lag = min(lag + now - previous, self.max_ticks_per_frame * tick)
+            previous = now
+            while lag >= tick and not end:
+                lag -= tick
 
-            self.message("{}".format(number), x_center, y_center, self.menu_font)
+                # Process inputs, detect collisions and spawn things
+                self.store_positions()
+                game_end = self.update()
 
-            pygame.draw.polygon(self.window, down_color, down_triangle)
-            pygame.gfxdraw.aapolygon(self.window, down_triangle, down_color)
-            
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_UP:
-                        if number < n_max:
-                            number += 1
-                            self.sfx["confirm"].play()
-                    elif event.key == pygame.K_DOWN:
-                        if number > n_min:
-                            number -= 1
-                            self.sfx["confirm"].play()
-                    if event.key == pygame.K_RETURN:
-                        end = True
-                        self.sfx["confirm"].play()
-            
-            pygame.display.update()
-            self.CLOCK.tick(self.FPS)
+                if game_end and self.end_time == 0:
+                    self.end_time = self.now()
 
-        return number
-                
-    def explain_commands(self) -> None:
-        """
-        Display commands for each player
-        """
+                if game_end and self.now() - self.end_time >= self.endlaps:
+                    end = True
 
-        end = False
-        while not end:
+            # Draw everything, between the last two ticks
+            self.draw(lag / tick if self.interpolation else 1.0)
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        end = True
-                        self.sfx["confirm"].play()
-
-            self.window.fill((0, 0, 0))
-
-            x_base = 3.0/5.0 * self.window_width
-            y_base = lambda i : i * 80 + 50 
-            key_width = 50
-            key_height = 25
-            padding = 5
-            id_padding = 5
-            
-            for i in range(self.nb_of_players):
+            # Wait for the next displayed frame
+            self.wait_next_frame()
+            self.profiler.mark("tick")
+            self.profiler.end_frame()
 
-                y = y_base(i)
+        if writer is not None:
+            writer.close()
+            self.replay_writer = None
 
-                player = self.players[i]
-                self.message("Player {}".format(i + 1), 50, y + 15, self.name_font)
-                self.window.blit(player.image, (120, y))
+    def replay_loop(self, path: str, start_frame: int = 0) -> None:
+        """
+        Plays a replay file, starting at the given frame.
+        Raises a ValueError if the file or the frame is wrong.
+        """
+        replay = Replay(path)
+        self.fixed_timestep = True
+        self.nb_of_players = replay.nb_of_players
+        self.create_players(self.nb_of_players)
+        self.reset_round()
+        self.invalidate_drawing()
 
-                y += 10
+        source = self.input_source
+        try:
+            self.input_source = ReplaySource(replay.seek(self, start_frame))
+            while not self.input_source.ended:
+                if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                    break
+                self.update()
+                self.draw()
+                self.CLOCK.tick(self.FPS)
+        finally:
+            self.input_source = source
+            replay.close()
 
-                # key up
-                pygame.draw.rect(self.window, self.WHITE,
-                                 Rect(x_base, y - key_height - padding, key_width, key_height),
-                                 1)
+    """ HUD """
 
-                self.message(pygame.key.name(player.controller.key_up), x_base + id_padding,
-                             y - key_height + id_padding - padding, self.name_font)
+    def message(self, message: str, x_pos: int, y_pos: int, font: Font = None, 
+                fontsize: int = None, color=WHITE) -> None:
+        """
+        Display a message for the next frame.
+        """
+        if font is None:
+            font = self.sized_font(self.FONTSIZE if fontsize is None else fontsize)
 
-                # key down
-                pygame.draw.rect(self.window, self.WHITE,
-                                 Rect(x_base, y, key_width, key_height), 1)
+        text = self.text_cache.render(font, message, True, color)
 
-                self.message(pygame.key.name(player.controller.key_down), x_base + id_padding,
-                             y + id_padding, self.name_font)
+        self.window.blit(text, (x_pos, y_pos))
 
-                # key left
-                pygame.draw.rect(self.window, self.WHITE,
-                                 Rect(x_base - key_width - padding, y, key_width, key_height),
-                                 1)
+    def sized_font(self, size: int) -> Font:
+        """
+        Returns the hud font at the given size.
+        """
+        font = self.sized_fonts.get(size)
+        if font is None:
+            font = pygame.font.SysFont(self.hud_font, size)
+            self.sized_fonts[size] = font
+        return font
 
-                self.message(pygame.key.name(player.controller.key_left), x_base - key_width +\
-                             id_padding, y + id_padding, self.name_font)
+    def title_screen(self) -> None:
+        """
+        Display the title screen and wait for input.
+        """
+        TitleScreen(self).run()
 
-                # key right
-                pygame.draw.rect(self.window, self.WHITE,
-                                 Rect(x_base + key_width + padding, y, key_width, key_height),
-                                 1)
+    def ask_number_of_player(self) -> int:
+        """
+        Ask the player the number of players to
+        play with. Returns this number
+        """
+        return PlayerNumberMenu(self).run()
 
-                self.message(pygame.key.name(player.controller.key_right), x_base + key_width +\
-                             id_padding + padding, y + id_padding, self.name_font)
+    def explain_commands(self) -> None:
+        """
+        Display commands for each player
+        """
+        CommandsScreen(self).run()
 
-            pygame.display.update()
-            self.CLOCK.tick(self.FPS)
-    
     def end_board(self) -> None:
         """
         Displays the scores
         """
-        end = False
-        while not end:
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        end = True
-                        self.sfx["confirm"].play()
-
-            self.window.fill((0, 0, 0))
-
-            x_base = 3.0/5.0 * self.window_width
-            y_base = lambda i : i * 80 + 50
-            padding = 10
+        EndBoard(self).run()
 
-            self.message("Score", x_base, y_base(0) - 30, self.menu_font)
-
-            for i in range(self.nb_of_players):
-
-                y = y_base(i)
-
-                player = self.players[i]
-                self.message("Player {}".format(player.pid), 45, y + 15, self.name_font)
-                self.window.blit(player.image, (130, y))
-
-                self.message("{}".format(player.score), x_base, y + padding)
+    def seat_bots(self, humans: int) -> None:
+        """
+        Gives the players after the humans' ones to lookahead bots,
+        whose moves are sampled with the humans' inputs.
+        """
+        from bots import BotSource, LookaheadBot
 
-            pygame.display.update()
-            self.CLOCK.tick(self.FPS)
+        source = self.input_source
+        # the bots of the previous round are replaced
+        if isinstance(source, BotSource):
+            source = source.base
+        self.input_source = BotSource(source, {i : LookaheadBot(self.rng.randrange(1 << 30))
+                                               for i in range(humans, len(self.players))})
 
     """ MAIN """
 
@@ -945,17 +1399,24 @@ class Game(object):
         # preparing
         self.title_screen()
 
+        rounds = 0
         while True:
+            rounds += 1
 
             # reinit variables
-            self.obstacles = []
-            self.items = []
-            self.nb_of_players = self.ask_number_of_player()
+            self.reset_round()
+            humans = self.ask_number_of_player()
+            self.nb_of_players = min(self.MAXIMUM_PLAYERS, humans + self.bot_seats)
             self.create_players(self.nb_of_players)
+            if self.bot_seats > 0:
+                self.seat_bots(humans)
             self.explain_commands()
 
             # main game loop
-            self.game_loop()
+            record = self.record_path
+            if record is not None and rounds > 1:
+                record = "{}.{}".format(record, rounds)
+            self.game_loop(record)
 
             # sort player list by score for final end board
             self.sort_players()
@@ -964,5 +1425,57 @@ class Game(object):
 # Runs the game
 if __name__ == '__main__':
 
-    game = Game()
-    game.run_game()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Save Your Assteroid")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the random numbers, makes the rounds reproducible")
+    parser.add_argument("--dirty-rendering", action="store_true",
+                        help="only redraws the areas of the screen which changed")
+    parser.add_argument("--pixel-collisions", action="store_true",
+                        help="collides with the sprites' pixels instead of the hitboxes")
+    parser.add_argument("--joysticks", action="store_true",
+                        help="the players can also use the joysticks, one per player")
+    parser.add_argument("--bots", type=int, default=0,
+                        help="number of seats taken by bots after the human players")
+    parser.add_argument("--render-rate", type=int, default=None,
+                        help="frames per second of the display, 0 for unlimited; "
+                        "the simulation runs at 60 ticks per second anyway")
+    parser.add_argument("--no-interpolation", action="store_true",
+                        help="draws the actors at their last simulated positions")
+    parser.add_argument("--profile", action="store_true",
+                        help="displays the time spent in each phase of the frames")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="writes the phases timings of every frame in a .csv or .json file")
+    parser.add_argument("--latency", metavar="FILE", nargs="?", const="", default=None,
+                        help="measures the input lag, prints it at exit and writes it "
+                        "in a .json file if given")
+    parser.add_argument("--record", metavar="FILE", default=None,
+                        help="records the rounds in replay files")
+    parser.add_argument("--replay", metavar="FILE", default=None,
+                        help="plays a replay file")
+    parser.add_argument("--replay-frame", type=int, default=0,
+                        help="frame where the replay starts")
+    args = parser.parse_args()
+
+    game = Game(args.seed)
+    game.dirty_rendering = args.dirty_rendering
+    game.pixel_collisions = args.pixel_collisions
+    game.bot_seats = args.bots
+    game.render_rate = args.render_rate
+    game.interpolation = not args.no_interpolation
+    if args.joysticks:
+        game.input_source = MergedSource(KeyboardSource(), JoystickSource())
+    if args.profile or args.trace is not None:
+        game.profiler = FrameProfiler(overlay=args.profile, trace=args.trace is not None)
+        if args.trace is not None:
+            atexit.register(game.profiler.dump, args.trace)
+    if args.latency is not None:
+        game.latency = LatencyProbe()
+        atexit.register(game.latency.dump, args.latency or None)
+    if args.replay is not None:
+        try:
+            game.replay_loop(args.replay, args.replay_frame)
+        except ValueError as error:
+            parser.error(str(error))
+    else:
+        game.record_path = args.record
+        game.run_game()
\ No newline at end of file
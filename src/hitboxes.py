@@ -0,0 +1,274 @@
+"""
+Hitboxes module.
+Derives the hitboxes of the sprites from their alpha channel, and
+caches them in a sidecar file of the resources folder.
+
+The sidecar file is regenerated with:
+
+    python hitboxes.py --max-rects 5 --coverage 0.85
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import pygame
+from pygame.mask import Mask
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+# Alpha above which a pixel is solid
+THRESHOLD = 127
+# Images bigger than this are not sprites, the tool skips them
+MAX_SPRITE_SIZE = 128
+
+
+class SolidPixels(object):
+    """
+    Counts the solid pixels of an image in any rect, with a
+    summed-area table.
+    """
+
+    def __init__(self, mask: Mask):
+        self.width, self.height = mask.get_size()
+        # table[y][x] = number of solid pixels above and left of (x, y)
+        self.table = [[0] * (self.width + 1)]
+        for y in range(self.height):
+            row = [0]
+            line = 0
+            above = self.table[-1]
+            for x in range(self.width):
+                line += mask.get_at((x, y))
+                row.append(above[x + 1] + line)
+            self.table.append(row)
+
+    def count(self, left: int, top: int, right: int, bottom: int) -> int:
+        """
+        Returns the number of solid pixels in [left, right[ x [top, bottom[.
+        """
+        table = self.table
+        return table[bottom][right] - table[top][right] - table[bottom][left] + table[top][left]
+
+    def tighten(self, rect: Rect) -> Rect:
+        """
+        Returns the smallest rect containing the solid pixels
+        inside the given rect, or None if there are none.
+        """
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+        if self.count(left, top, right, bottom) == 0:
+            return None
+        while self.count(left, top, right, top + 1) == 0:
+            top += 1
+        while self.count(left, bottom - 1, right, bottom) == 0:
+            bottom -= 1
+        while self.count(left, top, left + 1, bottom) == 0:
+            left += 1
+        while self.count(right - 1, top, right, bottom) == 0:
+            right -= 1
+        return Rect(left, top, right - left, bottom - top)
+
+    def split(self, rect: Rect) -> "list of Rect":
+        """
+        Returns the best cut of a rect in two tightened rects, the
+        one with the smallest total area, or None if no cut reduces it.
+        """
+        best = None
+        best_area = rect.width * rect.height
+        cuts = [(Rect(rect.x, rect.y, cut, rect.height),
+                 Rect(rect.x + cut, rect.y, rect.width - cut, rect.height))
+                for cut in range(1, rect.width)]
+        cuts += [(Rect(rect.x, rect.y, rect.width, cut),
+                  Rect(rect.x, rect.y + cut, rect.width, rect.height - cut))
+                 for cut in range(1, rect.height)]
+
+        for first, second in cuts:
+            parts = [part for part in (self.tighten(first), self.tighten(second))
+                     if part is not None]
+            area = sum(part.width * part.height for part in parts)
+            if area < best_area:
+                best = parts
+                best_area = area
+        return best
+
+
+def cover(surface: Surface, max_rects: int = 5, coverage: float = 0.85) -> "list of Rect":
+    """
+    Returns a small set of rects covering every solid pixel of an
+    image. The rects are cut until at least the given part of their
+    area is solid, or until there are max_rects of them: more rects
+    give more accurate hitboxes but more tests per collision.
+    """
+    pixels = SolidPixels(pygame.mask.from_surface(surface, THRESHOLD))
+    solid = pixels.count(0, 0, pixels.width, pixels.height)
+    if not solid:
+        return []
+
+    rects = [pixels.tighten(surface.get_rect())]
+    while len(rects) < max_rects:
+        area = sum(rect.width * rect.height for rect in rects)
+        if solid >= coverage * area:
+            break
+
+        # cut the rect whose cut removes the most empty pixels
+        best = None
+        best_gain = 0
+        for i, rect in enumerate(rects):
+            parts = pixels.split(rect)
+            if parts is None:
+                continue
+            gain = rect.width * rect.height - sum(part.width * part.height for part in parts)
+            if gain > best_gain:
+                best = (i, parts)
+                best_gain = gain
+        if best is None:
+            break
+        i, parts = best
+        rects[i:i + 1] = parts
+
+    return rects
+
+
+class HitboxCache(object):
+    """
+    Gives the hitboxes of the images of the resources folder.
+    The hitboxes are read from a JSON sidecar file, where they are
+    keyed by the hash of the image and the cover settings. Missing
+    hitboxes are computed and added to the file.
+    The returned lists are shared and must not be modified.
+    """
+
+    # Folder containing the images
+    root = "resources"
+    # Sidecar file, relative to the root
+    filename = "hitboxes.json"
+
+    # Cover settings
+    max_rects = 5
+    coverage = 0.85
+
+    def __init__(self, root: str = None, max_rects: int = None, coverage: float = None):
+        if root is not None:
+            self.root = root
+        if max_rects is not None:
+            self.max_rects = max_rects
+        if coverage is not None:
+            self.coverage = coverage
+
+        # key -> list of (x, y, width, height), None until loaded
+        self.entries = None
+        # relative path -> list of Rect
+        self.hitboxes = {}
+
+    def path(self) -> str:
+        """
+        Returns the path of the sidecar file.
+        """
+        return os.path.join(self.root, self.filename)
+
+    def load(self) -> None:
+        """
+        Reads the sidecar file.
+        """
+        self.entries = {}
+        if os.path.exists(self.path()):
+            with open(self.path()) as sidecar:
+                self.entries = json.load(sidecar)
+
+    def save(self) -> None:
+        """
+        Writes the sidecar file.
+        """
+        # one image per line
+        lines = ['"{}": {}'.format(key, json.dumps(self.entries[key]))
+                 for key in sorted(self.entries)]
+        with open(self.path(), "w") as sidecar:
+            sidecar.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+    def key(self, data: bytes) -> str:
+        """
+        Returns the key of an image file's content.
+        """
+        return "{}:{}:{}".format(hashlib.sha1(data).hexdigest(), self.max_rects, self.coverage)
+
+    def rects(self, *path: str) -> "list of Rect":
+        """
+        Returns the hitboxes of the image at the given path, relative
+        to the resources folder. i.e. rects("items", "life.png")
+        """
+        name = os.path.join(*path)
+        hitboxes = self.hitboxes.get(name)
+        if hitboxes is not None:
+            return hitboxes
+
+        if self.entries is None:
+            self.load()
+        with open(os.path.join(self.root, name), "rb") as image:
+            data = image.read()
+        key = self.key(data)
+
+        values = self.entries.get(key)
+        if values is None:
+            surface = pygame.image.load(os.path.join(self.root, name))
+            values = [list(rect) for rect in cover(surface, self.max_rects, self.coverage)]
+            self.entries[key] = values
+            try:
+                self.save()
+            except OSError:
+                # read-only installs compute the hitboxes at each start
+                pass
+
+        hitboxes = [Rect(value) for value in values]
+        self.hitboxes[name] = hitboxes
+        return hitboxes
+
+    def clear(self) -> None:
+        """
+        Forgets the loaded hitboxes.
+        """
+        self.entries = None
+        self.hitboxes.clear()
+
+
+# Hitboxes shared by the whole game
+HITBOXES = HitboxCache()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Generates the hitboxes of the sprites")
+    parser.add_argument("images", nargs="*",
+                        help="images, relative to the resources folder, all by default")
+    parser.add_argument("--root", default=HitboxCache.root)
+    parser.add_argument("--max-rects", type=int, default=HitboxCache.max_rects,
+                        help="maximum number of rects per image")
+    parser.add_argument("--coverage", type=float, default=HitboxCache.coverage,
+                        help="part of the rects' area which must be solid")
+    args = parser.parse_args(argv)
+
+    images = args.images
+    if not images:
+        for folder, _, files in os.walk(args.root):
+            for name in files:
+                path = os.path.join(folder, name)
+                # the backgrounds and the screens never collide
+                if name.endswith(".png") and\
+                    max(pygame.image.load(path).get_size()) <= MAX_SPRITE_SIZE:
+                    images.append(os.path.relpath(path, args.root))
+
+    cache = HitboxCache(args.root, args.max_rects, args.coverage)
+    # the sidecar only keeps the hitboxes of the current images
+    cache.entries = {}
+    for image in sorted(images):
+        rects = cache.rects(image)
+        print("{:<30} {}".format(image, " ".join(str(tuple(rect)) for rect in rects)))
+    cache.save()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Inputs module.
+The players' inputs of a frame are sampled once, from an input
+source, into one bitmask per player. Keyboard, joysticks, scripts,
+bots and replays are all sources giving these masks.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import pygame
+
+# Bits of a player input mask
+UP = 1
+LEFT = 2
+DOWN = 4
+RIGHT = 8
+
+
+def input_mask(player: "Player", keys) -> int:
+    """
+    Returns the input mask of a player from the keys state.
+    The player's original keys are used, so that the mask doesn't
+    depend on the item effects.
+    """
+    controller = player.controller
+    mask = 0
+    if keys[controller.old_key_up]:
+        mask |= UP
+    if keys[controller.old_key_left]:
+        mask |= LEFT
+    if keys[controller.old_key_down]:
+        mask |= DOWN
+    if keys[controller.old_key_right]:
+        mask |= RIGHT
+    return mask
+
+
+def pressed_keys(players: "list of Player", masks: "list of int") -> list:
+    """
+    Returns the keys pressed to give the players these masks.
+    """
+    pressed = []
+    for player, mask in zip(players, masks):
+        controller = player.controller
+        if mask & UP:
+            pressed.append(controller.old_key_up)
+        if mask & LEFT:
+            pressed.append(controller.old_key_left)
+        if mask & DOWN:
+            pressed.append(controller.old_key_down)
+        if mask & RIGHT:
+            pressed.append(controller.old_key_right)
+    return pressed
+
+
+class InputSource(object):
+    """
+    Represents an abstract input source.
+    """
+
+    def sample(self, game: "Game") -> "list of int":
+        """
+        Returns the input mask of every player for the next frame.
+        Must be overriden.
+        """
+        return [0] * len(game.players)
+
+
+class KeyboardSource(InputSource):
+    """
+    The players' keys, read from one keyboard state per frame.
+    Without keys state given, the keyboard is read with pygame.
+    """
+
+    def __init__(self, keys=None):
+        # keys state indexable by key ID, e.g. simulation.KeyState
+        self.keys = keys
+
+    def sample(self, game: "Game") -> "list of int":
+        keys = self.keys if self.keys is not None else pygame.key.get_pressed()
+        return [input_mask(player, keys) for player in game.players]
+
+
+class JoystickSource(InputSource):
+    """
+    One joystick per player, in the order of the players. The
+    joystick's hat is used, or its first stick.
+    """
+
+    # stick deflection under which it is centered
+    dead_zone = 0.5
+
+    def __init__(self):
+        if not pygame.joystick.get_init():
+            pygame.joystick.init()
+        self.joysticks = [pygame.joystick.Joystick(i)
+                          for i in range(pygame.joystick.get_count())]
+
+    def joystick_mask(self, joystick: "pygame.joystick.Joystick") -> int:
+        """
+        Returns the input mask given by a joystick.
+        """
+        if joystick.get_numhats() > 0:
+            x, y = joystick.get_hat(0)
+            # the hats' y axis goes up
+            y = -y
+        elif joystick.get_numaxes() >= 2:
+            x, y = joystick.get_axis(0), joystick.get_axis(1)
+        else:
+            return 0
+
+        mask = 0
+        if y <= -self.dead_zone:
+            mask |= UP
+        elif y >= self.dead_zone:
+            mask |= DOWN
+        if x <= -self.dead_zone:
+            mask |= LEFT
+        elif x >= self.dead_zone:
+            mask |= RIGHT
+        return mask
+
+    def sample(self, game: "Game") -> "list of int":
+        joysticks = self.joysticks
+        return [self.joystick_mask(joysticks[i]) if i < len(joysticks) else 0
+                for i in range(len(game.players))]
+
+
+class ScriptedSource(InputSource):
+    """
+    Masks given by a function (game, frame) -> masks, or by a list
+    of the masks of each frame (no move after its end). The frames
+    are numbered from 1, as game.frame during the frame.
+    """
+
+    def __init__(self, script):
+        self.script = script
+
+    def sample(self, game: "Game") -> "list of int":
+        frame = game.frame
+        if callable(self.script):
+            return list(self.script(game, frame))
+        if 0 < frame <= len(self.script):
+            return list(self.script[frame - 1])
+        return [0] * len(game.players)
+
+
+class ManualSource(InputSource):
+    """
+    Masks set by the caller before each frame.
+    """
+
+    def __init__(self):
+        self.masks = []
+
+    def set(self, masks: "list of int") -> None:
+        """
+        Sets the masks of the next frame.
+        """
+        self.masks = masks
+
+    def sample(self, game: "Game") -> "list of int":
+        return self.masks
+
+
+class ReplaySource(InputSource):
+    """
+    Masks read from the frames' inputs of a replay (see
+    Replay.seek). No move after its end.
+    """
+
+    def __init__(self, inputs: "iterator of list of int"):
+        self.inputs = inputs
+        # masks of the next frame, None at the end
+        self.next_masks = next(self.inputs, None)
+
+    @property
+    def ended(self) -> bool:
+        """
+        Indicates whether every input of the replay was given.
+        """
+        return self.next_masks is None
+
+    def sample(self, game: "Game") -> "list of int":
+        masks = self.next_masks
+        if masks is None:
+            return [0] * len(game.players)
+        self.next_masks = next(self.inputs, None)
+        return masks
+
+
+class MergedSource(InputSource):
+    """
+    Several sources at once, e.g. keyboard and joysticks: the
+    masks of a player are merged.
+    """
+
+    def __init__(self, *sources: InputSource):
+        self.sources = sources
+
+    def sample(self, game: "Game") -> "list of int":
+        merged = [0] * len(game.players)
+        for source in self.sources:
+            for i, mask in enumerate(source.sample(game)):
+                if i < len(merged):
+                    merged[i] |= mask
+        return merged
+
+
+if __name__ == '__main__':
+
+    from simulation import KeyState
+
+    class Controller(object):
+        old_key_up, old_key_left, old_key_down, old_key_right = 10, 11, 12, 13
+
+    class Player(object):
+        controller = Controller()
+
+    class Game(object):
+        players = [Player(), Player()]
+        frame = 0
+
+    game = Game()
+    keyboard = KeyboardSource(KeyState([10, 13]))
+    assert keyboard.sample(game) == [UP | RIGHT, UP | RIGHT]
+    assert sorted(pressed_keys(game.players[:1], [UP | RIGHT])) == [10, 13]
+
+    scripted = ScriptedSource([[LEFT, 0]])
+    game.frame = 1
+    assert scripted.sample(game) == [LEFT, 0]
+    game.frame = 2
+    assert scripted.sample(game) == [0, 0]
+
+    merged = MergedSource(scripted, ScriptedSource(lambda game, frame: [DOWN]))
+    assert merged.sample(game) == [DOWN, 0]
+
+    replay = ReplaySource(iter([[UP, 0], [0, DOWN]]))
+    assert replay.sample(game) == [UP, 0] and not replay.ended
+    assert replay.sample(game) == [0, DOWN] and replay.ended
+    assert replay.sample(game) == [0, 0]
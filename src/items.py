@@ -7,12 +7,14 @@ Ludum Dare 41
 
 """
 
-import os
 import time
 import pygame
 from pygame.surface import Surface
 from pygame.rect import Rect
 from actor import Actor
+from assets import ASSETS
+from effects import SPEED, INVERTED
+from hitboxes import HITBOXES
 from player import Player
 
 class Item(Actor):
@@ -32,25 +34,47 @@ class Item(Actor):
     # timer start
     start = 0
 
+    # generation of the item's timers, see timers.py
+    timer = 0
+
     enabled = False
 
     # If bonus = False, the item is a malus. Used for random spawn
     bonus = True
 
+    # sprite, relative to the resources folder
+    sprite = None
+
     def __init__(self, master: "Game", x: int = 0, y: int = 0):
 
-        # hitboxes
-        self.orig_hitboxes = [
-            Rect(1, 1, 19, 19)
-        ]
+        # hitboxes generated from the sprite, see hitboxes.py
+        if self.sprite is not None:
+            image = ASSETS.image(*self.sprite)
+            self.orig_hitboxes = HITBOXES.rects(*self.sprite)
+        else:
+            image = Surface((100, 100))
+            self.orig_hitboxes = [
+                Rect(1, 1, 19, 19)
+            ]
+        self.hitboxes = [Rect(hitbox) for hitbox in self.orig_hitboxes]
 
-        self.hitboxes = [
-            Rect(1, 1, 19, 19)
-        ]
+        Actor.__init__(self, master, image, x, y)
 
-        Actor.__init__(self, master, Surface((100, 100)), x, y)
+        self.time_alive_start = self.now()
 
-        self.time_alive_start = time.time()
+    def reset(self, x: int, y: int) -> None:
+        """
+        Puts the item back in the state of a new one at (x, y),
+        so that it can be reused instead of creating another one.
+        """
+        self.activator = None
+        self.enabled = False
+        self.start = 0
+        self.rect.x = x
+        self.rect.y = y
+        self.update_hitboxes()
+
+        self.time_alive_start = self.now()
 
     def activate(self, activator: Player):
         """
@@ -58,12 +82,13 @@ class Item(Actor):
         """
         self.activator = activator
         self.enabled = True
-        self.start = time.time()
+        self.start = self.now()
 
     def apply(self, players : "list of Player") -> "list of Player":
         """
         Applies the script if and only if the item is enabled and
-        an good activator has been given.
+        an good activator has been given. Called once, when the
+        item is activated.
         """
         if self.enabled and not self.times_up():
             return self.script(players)
@@ -72,16 +97,31 @@ class Item(Actor):
 
     def script(self, players : "list of Player") -> "list of Player":
         """
-        Applies the item's script to the players.
+        Applies the item's instant effect to the players.
         Must be overriden if you create a real item.
         """
         return players
 
+    def modifier(self, player: Player) -> (str, object):
+        """
+        Returns the modifier (stat, value) given to a player while
+        the item's effect lasts, or None (see effects.py).
+        """
+        return None
+
     def times_up(self) -> bool:
         """
         Indicates if the item's effect duration has been reached.
         """
-        return self.enabled and time.time() - self.start >= self.duration
+        return self.enabled and self.now() - self.start >= self.duration
+
+    def now(self) -> float:
+        """
+        Returns the game time, or the wall clock time without game.
+        """
+        if self.game_master is not None:
+            return self.game_master.now()
+        return time.time()
 
     def move(self, direction: int = 0) -> None:
         """
@@ -97,20 +137,12 @@ class Slower(Item):
 
     duration = 5
 
-    def __init__(self, master: "Game", x: int, y: int):
-        Item.__init__(self, master, x, y)
-        self.image = pygame.image.load("resources" + os.path.sep + "items" +\
-                              os.path.sep + "slower.png")
-        self.set_image(self.image, x, y)
+    sprite = ("items", "slower.png")
 
-    def script(self, players: "list of Player") -> "list of Player":
-        """
-        Applies the script.
-        """
-        for player in players:
-            if player != self.activator:
-                player.speed = player.speed / 2.0
-        return players
+    def modifier(self, player: Player) -> (str, object):
+        if player != self.activator:
+            return (SPEED, 0.5)
+        return None
 
 class OneLife(Item):
     """
@@ -120,11 +152,11 @@ class OneLife(Item):
     duration = 1
     used = False
 
-    def __init__(self, master: "Game", x: int, y: int):
-        Item.__init__(self, master, x, y)
-        self.image = pygame.image.load("resources" + os.path.sep + "items" +\
-                              os.path.sep + "life.png")
-        self.set_image(self.image, x, y)
+    sprite = ("items", "life.png")
+
+    def reset(self, x: int, y: int) -> None:
+        Item.reset(self, x, y)
+        self.used = False
 
     def script(self, players: "list of Player") -> "list of Player":
         """
@@ -146,25 +178,16 @@ class InvertControl(Item):
     duration = 5
     bonus = False
 
-    def __init__(self, master: "Game", x: int, y: int):
-        Item.__init__(self, master, x, y)
-        self.image = pygame.image.load("resources" + os.path.sep + "items" +\
-                              os.path.sep + "invert_control.png")
-        self.set_image(self.image, x, y)
+    sprite = ("items", "invert_control.png")
 
-    def script(self, players: "list of Player") -> "list of Player":
-        """
-        Applies the script.
-        """
-        for player in players:
-            if player == self.activator:
-                old_up = player.controller.key_up
-                player.controller.key_up = player.controller.key_down
-                player.controller.key_down = old_up
-                old_left = player.controller.key_left
-                player.controller.key_left = player.controller.key_right
-                player.controller.key_right = old_left
-        return players
+    def modifier(self, player: Player) -> (str, object):
+        if player == self.activator:
+            return (INVERTED, True)
+        return None
+
+
+# Item classes by name, used to read them back (see snapshot.py)
+ITEM_CLASSES = {cls.__name__ : cls for cls in (Slower, OneLife, InvertControl)}
 
 if __name__ == '__main__':
 
@@ -188,3 +211,6 @@ if __name__ == '__main__':
     print("sleep for {}".format(actor.duration))
     time.sleep(actor.duration)
     assert actor.times_up()
+    actor.reset(10, 20)
+    assert not actor.enabled and actor.activator is None
+    assert actor.hitboxes[0].topleft == (11, 21)
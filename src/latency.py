@@ -0,0 +1,145 @@
+"""
+Latency module.
+Measures the input lag: the time between an input event, the frame
+which sampled the inputs, and the display update which showed that
+frame. Enabled with the --latency option of the game.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import json
+import time
+from collections import OrderedDict, deque
+
+import pygame
+
+# Events of the input devices
+INPUT_EVENTS = {pygame.KEYDOWN, pygame.KEYUP, pygame.JOYAXISMOTION, pygame.JOYHATMOTION,
+                pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP}
+
+# Measured intervals
+EVENT_TO_SAMPLE = "event_to_sample"
+SAMPLE_TO_PRESENT = "sample_to_present"
+EVENT_TO_PRESENT = "event_to_present"
+
+
+class LatencyProbe(object):
+    """
+    Timestamps the input events when they are received, then the
+    sampling of the inputs which used them, then the display update
+    which showed the frame. The events are only seen when the game
+    reads them, so the game must read them while it waits for the
+    next frame (see Game.wait_next_frame).
+    """
+
+    # number of measures kept per interval
+    history = 10000
+
+    def __init__(self, history: int = None):
+        if history is not None:
+            self.history = history
+        # reception times of the events not sampled yet
+        self.received = []
+        # (reception, sampling) times of the events not shown yet
+        self.sampled = []
+        # interval -> durations in s
+        self.durations = OrderedDict((name, deque(maxlen=self.history))
+                                     for name in (EVENT_TO_SAMPLE, SAMPLE_TO_PRESENT,
+                                                  EVENT_TO_PRESENT))
+
+    def event(self, event: pygame.event.Event, now: float = None) -> None:
+        """
+        Timestamps an event just received.
+        """
+        if event.type in INPUT_EVENTS:
+            self.received.append(time.perf_counter() if now is None else now)
+
+    def sample(self, now: float = None) -> None:
+        """
+        The inputs of a frame were sampled: the received events are
+        used by this frame.
+        """
+        if now is None:
+            now = time.perf_counter()
+        durations = self.durations[EVENT_TO_SAMPLE]
+        for received in self.received:
+            durations.append(now - received)
+            self.sampled.append((received, now))
+        del self.received[:]
+
+    def present(self, now: float = None) -> None:
+        """
+        The last sampled frame was shown.
+        """
+        if now is None:
+            now = time.perf_counter()
+        for received, sampled in self.sampled:
+            self.durations[SAMPLE_TO_PRESENT].append(now - sampled)
+            self.durations[EVENT_TO_PRESENT].append(now - received)
+        del self.sampled[:]
+
+    def summary(self) -> "OrderedDict":
+        """
+        Returns the distribution of each interval, in ms.
+        """
+        summary = OrderedDict()
+        for name, durations in self.durations.items():
+            values = sorted(durations)
+            point = lambda p: values[min(len(values) - 1, int(len(values) * p / 100.0))] * 1000.0\
+                if values else 0.0
+            summary[name] = OrderedDict([
+                ("count", len(values)),
+                ("mean", sum(values) * 1000.0 / len(values) if values else 0.0),
+                ("p50", point(50)),
+                ("p90", point(90)),
+                ("p99", point(99)),
+                ("max", values[-1] * 1000.0 if values else 0.0)
+            ])
+        return summary
+
+    def report(self) -> str:
+        """
+        Returns the summary as text.
+        """
+        lines = ["{:<18} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            "latency (ms)", "count", "mean", "p50", "p90", "p99", "max")]
+        for name, stats in self.summary().items():
+            lines.append("{:<18} {:>6d} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f}".format(
+                name, stats["count"], stats["mean"], stats["p50"], stats["p90"], stats["p99"],
+                stats["max"]))
+        return "\n".join(lines)
+
+    def dump(self, path: str = None) -> None:
+        """
+        Prints the report, and writes the summary as JSON if a path
+        is given.
+        """
+        print(self.report())
+        if path is not None:
+            with open(path, "w") as output:
+                json.dump(self.summary(), output, indent=2)
+
+
+if __name__ == '__main__':
+
+    probe = LatencyProbe()
+    key = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_a)
+
+    # two events before the sampling at 10 ms, shown at 25 ms
+    probe.event(key, now=0.000)
+    probe.event(key, now=0.004)
+    probe.event(pygame.event.Event(pygame.USEREVENT), now=0.005)
+    probe.sample(now=0.010)
+    probe.present(now=0.025)
+    # nothing new
+    probe.sample(now=0.030)
+    probe.present(now=0.040)
+
+    summary = probe.summary()
+    assert summary[EVENT_TO_SAMPLE]["count"] == 2
+    assert abs(summary[EVENT_TO_SAMPLE]["max"] - 10.0) < 1e-6
+    assert abs(summary[SAMPLE_TO_PRESENT]["mean"] - 15.0) < 1e-6
+    assert abs(summary[EVENT_TO_PRESENT]["mean"] - 23.0) < 1e-6
+    assert "event_to_present" in probe.report()
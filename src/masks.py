@@ -0,0 +1,93 @@
+"""
+Masks module.
+Collision masks of the sprites, used by the pixel perfect
+collisions.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+from collections import OrderedDict
+
+import pygame
+from pygame.mask import Mask
+from pygame.surface import Surface
+
+
+class MaskCache(object):
+    """
+    Caches the masks of the images, keyed by image. The rotated
+    images come from the rotation cache, so there is one mask per
+    sprite and per quantized angle. The least recently used masks
+    are evicted when the cache is full.
+    """
+
+    # Maximum number of stored masks
+    max_entries = 4096
+    # Alpha above which a pixel is solid
+    threshold = 127
+
+    def __init__(self, max_entries: int = None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+
+        self.masks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image: Surface) -> Mask:
+        """
+        Returns the mask of the solid pixels of an image.
+        """
+        mask = self.masks.get(image)
+
+        if mask is not None:
+            self.masks.move_to_end(image)
+            self.hits += 1
+            return mask
+
+        self.misses += 1
+        mask = pygame.mask.from_surface(image, self.threshold)
+        self.masks[image] = mask
+        if len(self.masks) > self.max_entries:
+            self.masks.popitem(last=False)
+        return mask
+
+    def overlap(self, image: Surface, position: (int, int),
+                other: Surface, other_position: (int, int)) -> bool:
+        """
+        Indicates whether the solid pixels of two images placed
+        at the given positions overlap.
+        """
+        offset = (other_position[0] - position[0], other_position[1] - position[1])
+        return self.get(image).overlap(self.get(other), offset) is not None
+
+    def clear(self) -> None:
+        """
+        Empties the cache.
+        """
+        self.masks.clear()
+
+
+if __name__ == '__main__':
+
+    pygame.init()
+
+    solid = Surface((10, 10), pygame.SRCALPHA)
+    solid.fill((255, 255, 255, 255))
+    ring = Surface((10, 10), pygame.SRCALPHA)
+    pygame.draw.rect(ring, (255, 255, 255, 255), ring.get_rect(), 1)
+
+    cache = MaskCache(max_entries=1)
+    assert cache.get(solid) is cache.get(solid)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get(ring).count() == 36
+    assert len(cache.masks) == 1
+
+    assert cache.overlap(solid, (0, 0), ring, (9, 9))
+    assert not cache.overlap(solid, (0, 0), ring, (10, 0))
+    # the ring is empty inside
+    small = Surface((2, 2), pygame.SRCALPHA)
+    small.fill((255, 255, 255, 255))
+    assert not cache.overlap(ring, (0, 0), small, (4, 4))
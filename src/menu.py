@@ -0,0 +1,379 @@
+"""
+Menu module.
+Screens shown between the rounds. They only redraw when something
+changes, and sleep until the next event when nothing moves.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import sys
+import time
+
+import pygame
+import pygame.gfxdraw
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+from obstacle import Obstacle
+
+# Events after which the window content must be drawn again
+REDRAW_EVENTS = {pygame.VIDEOEXPOSE, pygame.VIDEORESIZE}
+if hasattr(pygame, "WINDOWEXPOSED"):
+    REDRAW_EVENTS.add(pygame.WINDOWEXPOSED)
+
+
+class Menu(object):
+    """
+    Represents an abstract menu screen.
+    The screen is drawn again only when marked as dirty, i.e. after
+    its state changed. While an animation runs, the menu is drawn
+    every frame; otherwise the loop sleeps in pygame.event.wait
+    until an event comes.
+    """
+
+    # frames per second of the animations
+    FPS = 60
+    # maximum sleep, in ms, when nothing moves
+    idle_timeout = 1000
+
+    def __init__(self, game: "Game"):
+        self.game = game
+        # the menu must be drawn again
+        self.dirty = True
+        # the menu is closed
+        self.done = False
+        # value returned by run()
+        self.result = None
+        # number of times the menu was drawn
+        self.draws = 0
+
+        self.clock = pygame.time.Clock()
+
+    def animated(self) -> bool:
+        """
+        Indicates whether an animation is running.
+        """
+        return False
+
+    def animate(self) -> None:
+        """
+        Advances the animation of one frame.
+        """
+        pass
+
+    def handle(self, event: pygame.event.Event) -> None:
+        """
+        Reacts to an event.
+        Must be overriden, and must set dirty when the state changes.
+        """
+        pass
+
+    def draw(self, window: Surface) -> None:
+        """
+        Draws the whole menu.
+        Must be overriden.
+        """
+        pass
+
+    def close(self, result=None) -> None:
+        """
+        Closes the menu with the confirm sound.
+        """
+        self.result = result
+        self.done = True
+        self.game.sfx["confirm"].play()
+
+    def events(self) -> list:
+        """
+        Returns the pending events, waiting for one if the menu
+        is idle.
+        """
+        if self.animated():
+            return pygame.event.get()
+
+        event = pygame.event.wait(self.idle_timeout)
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def step(self) -> None:
+        """
+        Processes the events, and draws the menu if needed.
+        """
+        for event in self.events():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit(0)
+            if event.type in REDRAW_EVENTS:
+                self.dirty = True
+            self.handle(event)
+
+        if self.animated():
+            self.animate()
+            self.dirty = True
+
+        if self.dirty and not self.done:
+            self.draw(self.game.window)
+            pygame.display.update()
+            self.dirty = False
+            self.draws += 1
+
+        if self.animated():
+            self.clock.tick(self.FPS)
+
+    def run(self):
+        """
+        Shows the menu until it is closed. Returns its result.
+        """
+        while not self.done:
+            self.step()
+        return self.result
+
+
+class TitleScreen(Menu):
+    """
+    Title screen with asteroids crossing it, closed by any key.
+    """
+
+    # Seconds without event after which the asteroids stop, so that
+    # a waiting screen doesn't use the CPU
+    animation_duration = 60
+
+    def __init__(self, game: "Game"):
+        Menu.__init__(self, game)
+
+        self.asteroids = []
+        for i in range(5):
+            asteroid = Obstacle(game, game.window_width + game.rng.randint(10, 100),
+                                game.rng.randint(150, 300))
+            asteroid.speed = game.rng.randint(1, 30) / 10.0
+            asteroid.rotating_speed = game.rng.randint(-3, 3)
+            asteroid.move_x = game.rng.randint(-3, -1)
+            self.asteroids.append(asteroid)
+
+        self.last_event = time.time()
+
+    def animated(self) -> bool:
+        return time.time() - self.last_event < self.animation_duration
+
+    def animate(self) -> None:
+        game = self.game
+        for asteroid in self.asteroids:
+            if asteroid.rect.x + asteroid.rect.width < 0:
+                asteroid.rect.x = game.rng.randint(10, 100) + game.window_width
+                asteroid.rect.y = game.rng.randint(150, 300)
+            asteroid.move()
+            asteroid.rotate(asteroid.rotating_speed)
+
+    def handle(self, event: pygame.event.Event) -> None:
+        # any activity restarts the animation
+        self.last_event = time.time()
+        if event.type == pygame.KEYDOWN:
+            self.close()
+
+    def draw(self, window: Surface) -> None:
+        game = self.game
+        window.blit(game.greeter, (0, 0))
+        game.message("Save Your Assteroid", 35, 150, game.menu_font)
+        game.message("Press a key", 140, 200, game.sub_menu_font)
+        for asteroid in self.asteroids:
+            asteroid.draw(window)
+
+
+class PlayerNumberMenu(Menu):
+    """
+    Asks the number of players. Its result is this number.
+    """
+
+    n_min = 1
+    n_max = 4
+    grey = (70, 70, 70)
+
+    def __init__(self, game: "Game"):
+        Menu.__init__(self, game)
+        self.number = 1
+
+    def handle(self, event: pygame.event.Event) -> None:
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_UP:
+            if self.number < self.n_max:
+                self.number += 1
+                self.dirty = True
+                self.game.sfx["confirm"].play()
+        elif event.key == pygame.K_DOWN:
+            if self.number > self.n_min:
+                self.number -= 1
+                self.dirty = True
+                self.game.sfx["confirm"].play()
+        if event.key == pygame.K_RETURN:
+            self.close(self.number)
+
+    def draw(self, window: Surface) -> None:
+        game = self.game
+        window.fill((0, 0, 0))
+        game.message("Choose the number of players", 50, 100, game.sub_menu_font)
+
+        x_center = game.window_width / 2 - 20
+        y_center = game.window_height / 2 - 20
+
+        x_delta = 15
+        y_delta = 5
+
+        tri_width = 50
+        tri_height = 30
+        y_padding = 30
+
+        up_triangle = ((x_center - x_delta, y_center - y_delta),
+            (x_center - x_delta + tri_width, y_center - y_delta),
+            (x_center - x_delta + tri_width / 2, y_center - y_delta - tri_height))
+
+        down_triangle = ((x_center - x_delta, y_center + y_delta + y_padding),
+            (x_center - x_delta + tri_width, y_center + y_delta + y_padding),
+            (x_center - x_delta + tri_width / 2,
+                y_center + y_delta + tri_height + y_padding))
+
+        up_color = game.WHITE if self.number < self.n_max else self.grey
+        down_color = game.WHITE if self.number > self.n_min else self.grey
+
+        pygame.draw.polygon(window, up_color, up_triangle)
+        pygame.gfxdraw.aapolygon(window, up_triangle, up_color)
+
+        game.message("{}".format(self.number), x_center, y_center, game.menu_font)
+
+        pygame.draw.polygon(window, down_color, down_triangle)
+        pygame.gfxdraw.aapolygon(window, down_triangle, down_color)
+
+
+class CommandsScreen(Menu):
+    """
+    Displays the commands of each player, closed by Return.
+    """
+
+    def handle(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
+            self.close()
+
+    def draw(self, window: Surface) -> None:
+        game = self.game
+        window.fill((0, 0, 0))
+
+        x_base = 3.0/5.0 * game.window_width
+        y_base = lambda i : i * 80 + 50
+        key_width = 50
+        key_height = 25
+        padding = 5
+        id_padding = 5
+
+        for i in range(game.nb_of_players):
+
+            y = y_base(i)
+
+            player = game.players[i]
+            game.message("Player {}".format(i + 1), 50, y + 15, game.name_font)
+            window.blit(player.image, (120, y))
+
+            y += 10
+
+            # key up
+            pygame.draw.rect(window, game.WHITE,
+                             Rect(x_base, y - key_height - padding, key_width, key_height), 1)
+
+            game.message(pygame.key.name(player.controller.key_up), x_base + id_padding,
+                         y - key_height + id_padding - padding, game.name_font)
+
+            # key down
+            pygame.draw.rect(window, game.WHITE, Rect(x_base, y, key_width, key_height), 1)
+
+            game.message(pygame.key.name(player.controller.key_down), x_base + id_padding,
+                         y + id_padding, game.name_font)
+
+            # key left
+            pygame.draw.rect(window, game.WHITE,
+                             Rect(x_base - key_width - padding, y, key_width, key_height), 1)
+
+            game.message(pygame.key.name(player.controller.key_left), x_base - key_width +\
+                         id_padding, y + id_padding, game.name_font)
+
+            # key right
+            pygame.draw.rect(window, game.WHITE,
+                             Rect(x_base + key_width + padding, y, key_width, key_height), 1)
+
+            game.message(pygame.key.name(player.controller.key_right), x_base + key_width +\
+                         id_padding + padding, y + id_padding, game.name_font)
+
+
+class EndBoard(Menu):
+    """
+    Displays the scores, closed by Return.
+    """
+
+    def handle(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
+            self.close()
+
+    def draw(self, window: Surface) -> None:
+        game = self.game
+        window.fill((0, 0, 0))
+
+        x_base = 3.0/5.0 * game.window_width
+        y_base = lambda i : i * 80 + 50
+        padding = 10
+
+        game.message("Score", x_base, y_base(0) - 30, game.menu_font)
+
+        for i in range(game.nb_of_players):
+
+            y = y_base(i)
+
+            player = game.players[i]
+            game.message("Player {}".format(player.pid), 45, y + 15, game.name_font)
+            window.blit(player.image, (130, y))
+
+            game.message("{}".format(player.score), x_base, y + padding)
+
+
+if __name__ == '__main__':
+
+    import os
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    from game import Game
+
+    game = Game(seed=1)
+
+    def press(key: int) -> None:
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="",
+                                             scancode=0))
+
+    # static screens are drawn once
+    board = EndBoard(game)
+    board.idle_timeout = 10
+    for _ in range(5):
+        board.step()
+    assert board.draws == 1 and not board.done
+    press(pygame.K_RETURN)
+    assert board.run() is None and board.draws == 1
+
+    menu = PlayerNumberMenu(game)
+    menu.idle_timeout = 10
+    for key in (pygame.K_UP, pygame.K_UP, pygame.K_DOWN, pygame.K_DOWN, pygame.K_DOWN):
+        press(key)
+        menu.step()
+    press(pygame.K_UP)
+    press(pygame.K_RETURN)
+    assert menu.run() == 2
+    # the last down arrow changed nothing, closing draws nothing
+    assert menu.draws == 4
+
+    title = TitleScreen(game)
+    title.step()
+    title.step()
+    assert title.draws == 2
+    title.last_event -= title.animation_duration
+    title.idle_timeout = 10
+    title.step()
+    assert title.draws == 2
@@ -7,18 +7,18 @@ Ludum Dare 41
 
 """
 
-import os
 import random
 import pygame
 from actor import Actor
+from assets import ASSETS
+from hitboxes import HITBOXES
 from pygame.rect import Rect
 
 class Obstacle(Actor):
 
-    sep = os.path.sep
-    sprite_intact = pygame.image.load("resources" + sep + "asteroid.png")
-    sprite_destroyed = pygame.image.load("resources" + sep + "asteroid_destroyed.png")
-    img = sprite_intact
+    # sprites, relative to the resources folder
+    sprite_intact_path = ("asteroid.png",)
+    sprite_destroyed_path = ("asteroid_destroyed.png",)
 
     speed = 3.5
     rotating_speed = 1
@@ -27,19 +27,47 @@ class Obstacle(Actor):
 
     def __init__(self, master, x: int, y: int):
 
-        Actor.__init__(self, master, self.img, x, y)
+        self.sprite_intact = ASSETS.image(*self.sprite_intact_path)
+        self.sprite_destroyed = ASSETS.image(*self.sprite_destroyed_path)
 
-        self.rotating_speed = (1 if random.randint(0, 2) == 0 else -1 ) *\
-           (random.randrange(0, 3) + 0.5)
+        # hitboxes generated from the sprite, see hitboxes.py
+        self.orig_hitboxes = HITBOXES.rects(*self.sprite_intact_path)
+        self.hitboxes = [Rect(hitbox) for hitbox in self.orig_hitboxes]
 
-        self.move_x = random.randrange(-1, 2) * (random.randint(0, 50) / 10.0)
+        Actor.__init__(self, master, self.sprite_intact, x, y)
 
-        self.orig_hitboxes = [
-            Rect(5, 5, 29, 30)
-        ]
-        self.hitboxes = [
-            Rect(5, 5, 29, 30)
-        ]
+        self.reset(x, y)
+
+    def reset(self, x: int, y: int) -> None:
+        """
+        Puts the obstacle back in the state of a new one at (x, y),
+        so that it can be reused instead of creating another one.
+        """
+        self.destroyed = False
+        self.can_collide = True
+        self.speed = type(self).speed
+        self.rotation = 0
+
+        self.source_image = self.orig_image = self.image = self.sprite_intact
+        self.rect.size = self.sprite_intact.get_size()
+        self.rect.x = x
+        self.rect.y = y
+
+        master = self.game_master
+        self.rotating_speed, self.move_x = self.random_movement(
+            master.rng if master is not None else random)
+
+        self.update_hitboxes()
+
+    @staticmethod
+    def random_movement(rng: random.Random) -> (float, float):
+        """
+        Draws a random rotating speed and horizontal movement.
+        """
+        rotating_speed = (1 if rng.randint(0, 2) == 0 else -1 ) *\
+           (rng.randrange(0, 3) + 0.5)
+        move_x = rng.randrange(-1, 2) * (rng.randint(0, 50) / 10.0)
+        return (rotating_speed, move_x)
 
     def move(self):
         """
@@ -67,4 +95,10 @@ if __name__ == '__main__':
     actor.move()
     actor.move()
     actor.destroy()
-    assert actor.destroyed == True
\ No newline at end of file
+    assert actor.destroyed == True
+
+    actor.reset(10, 20)
+    assert not actor.destroyed and actor.can_collide
+    assert actor.image is actor.sprite_intact
+    assert actor.hitboxes[0].topleft == (10 + actor.orig_hitboxes[0].x,
+                                         20 + actor.orig_hitboxes[0].y)
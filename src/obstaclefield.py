@@ -0,0 +1,272 @@
+"""
+Obstacle field module.
+Alternative obstacle engine storing the asteroids in NumPy arrays
+instead of one Sprite per asteroid. Used for the stress modes,
+with thousands of asteroids on the screen.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import random
+
+import numpy
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+from actor import Actor
+from assets import ASSETS
+from hitboxes import HITBOXES
+from obstacle import Obstacle
+
+
+class ObstacleField(object):
+    """
+    A set of asteroids stored as a structure of arrays.
+    Movements, culling and collision tests are computed for all
+    the asteroids at once. The asteroids behave like Obstacle:
+    same sprites, same hitbox and same movements.
+    """
+
+    # Initial number of slots, doubled when full
+    capacity = 64
+
+    def __init__(self, master: "Game", capacity: int = None):
+        self.game_master = master
+        if capacity is not None:
+            self.capacity = capacity
+
+        self.sprite_intact = ASSETS.image(*Obstacle.sprite_intact_path)
+        self.sprite_destroyed = ASSETS.image(*Obstacle.sprite_destroyed_path)
+        self.width, self.height = self.sprite_intact.get_size()
+
+        # Obstacle's hitboxes, relative to the sprite
+        self.hitboxes = HITBOXES.rects(*Obstacle.sprite_intact_path)
+
+        # Number of live asteroids, stored in the first slots
+        self.count = 0
+        self.allocate(self.capacity)
+
+    def allocate(self, capacity: int) -> None:
+        """
+        Creates the arrays, keeping the live asteroids.
+        """
+        old = self.count
+        arrays = {
+            "x" : numpy.zeros(capacity),
+            "y" : numpy.zeros(capacity),
+            "move_x" : numpy.zeros(capacity),
+            "speed" : numpy.zeros(capacity),
+            "rotation" : numpy.zeros(capacity),
+            "rotating_speed" : numpy.zeros(capacity),
+            "destroyed" : numpy.zeros(capacity, dtype=bool)
+        }
+        for name, array in arrays.items():
+            if old:
+                array[:old] = getattr(self, name)[:old]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return self.count
+
+    def spawn(self, x: int, y: int, speed: float = Obstacle.speed,
+              move_x: float = None, rotating_speed: float = None) -> int:
+        """
+        Adds an asteroid and returns its index. The horizontal
+        movement and the rotation speed are random if not given,
+        like Obstacle's.
+        """
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+
+        if rotating_speed is None or move_x is None:
+            rng = self.game_master.rng if self.game_master is not None else random
+            random_rotating_speed, random_move_x = Obstacle.random_movement(rng)
+            if rotating_speed is None:
+                rotating_speed = random_rotating_speed
+            if move_x is None:
+                move_x = random_move_x
+
+        idx = self.count
+        # Rect coordinates are integers
+        self.x[idx] = int(x)
+        self.y[idx] = int(y)
+        self.move_x[idx] = move_x
+        self.speed[idx] = speed
+        self.rotation[idx] = 0
+        self.rotating_speed[idx] = rotating_speed
+        self.destroyed[idx] = False
+        self.count += 1
+        return idx
+
+    def move(self) -> None:
+        """
+        Moves and rotates every asteroid.
+        As with Rect.move_ip, the moves are truncated to integers.
+        """
+        n = self.count
+        self.rotation[:n] += self.rotating_speed[:n]
+        self.x[:n] += numpy.trunc(self.move_x[:n])
+        self.y[:n] += numpy.trunc(self.speed[:n])
+
+    def cull(self, width: int, height: int) -> int:
+        """
+        Deletes the asteroids which have left the given area.
+        Returns the number of deleted asteroids.
+        """
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        gone = (y - self.height > height) | (x + self.width < 0) | (x > width)
+        deleted = int(numpy.count_nonzero(gone))
+
+        if deleted:
+            keep = ~gone
+            kept = n - deleted
+            for array in (self.x, self.y, self.move_x, self.speed,
+                          self.rotation, self.rotating_speed, self.destroyed):
+                array[:kept] = array[:n][keep]
+            self.count = kept
+
+        return deleted
+
+    def collide(self, hitboxes: "list of Rect", boxes: "list of Rect" = None) -> numpy.ndarray:
+        """
+        Returns the indices of the intact asteroids colliding with
+        one of the given hitboxes. The asteroids' boxes, relative to
+        their sprite, are their hitboxes by default.
+        """
+        n = self.count
+        if n == 0 or not hitboxes:
+            return numpy.empty(0, dtype=int)
+
+        if boxes is None:
+            boxes = self.hitboxes
+        x = self.x[:n]
+        y = self.y[:n]
+
+        # Reject on the bounding boxes first
+        bounds = hitboxes[0].unionall(hitboxes)
+        outer = boxes[0].unionall(boxes)
+        hit = ~self.destroyed[:n] &\
+            (x + outer.left < bounds.right) & (x + outer.right > bounds.left) &\
+            (y + outer.top < bounds.bottom) & (y + outer.bottom > bounds.top)
+        candidates = numpy.flatnonzero(hit)
+        if len(candidates) == 0 or (len(hitboxes) == 1 and len(boxes) == 1):
+            return candidates
+
+        x = x[candidates]
+        y = y[candidates]
+        hit = numpy.zeros(len(candidates), dtype=bool)
+        for own in boxes:
+            left = x + own.left
+            top = y + own.top
+            right = x + own.right
+            bottom = y + own.bottom
+            for box in hitboxes:
+                hit |= (left < box.right) & (right > box.left) &\
+                    (top < box.bottom) & (bottom > box.top)
+        return candidates[hit]
+
+    def collide_pixels(self, image: Surface, position: (int, int)) -> list:
+        """
+        Returns the indices of the intact asteroids whose solid pixels
+        overlap the ones of the given image.
+        """
+        box = Rect(position, image.get_size())
+        candidates = self.collide([box], [Rect(0, 0, self.width, self.height)])
+        cache = Actor.rotation_cache
+        masks = Actor.mask_cache
+        return [index for index in candidates.tolist()
+                if masks.overlap(image, position,
+                                 cache.get(self.sprite_intact, self.rotation[index]),
+                                 (int(self.x[index]), int(self.y[index])))]
+
+    def destroy(self, indices: numpy.ndarray) -> None:
+        """
+        Destroys the given asteroids.
+        They can no longer hit anybody.
+        """
+        self.destroyed[indices] = True
+
+    def positions(self, alpha: float = 1.0) -> (list, list):
+        """
+        Returns the asteroids' x and y. With alpha < 1, the positions
+        are interpolated between the previous move and the last one,
+        alpha = 0 being the position before the last move.
+        """
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        if alpha < 1.0:
+            x = numpy.rint(x + (alpha - 1.0) * numpy.trunc(self.move_x[:n]))
+            y = numpy.rint(y + (alpha - 1.0) * numpy.trunc(self.speed[:n]))
+        return x.tolist(), y.tolist()
+
+    def rects(self, alpha: float = 1.0) -> "list of Rect":
+        """
+        Returns the rects of the asteroids' sprites.
+        """
+        return [Rect(x, y, self.width, self.height) for x, y in zip(*self.positions(alpha))]
+
+    def draw(self, window: Surface, alpha: float = 1.0) -> None:
+        """
+        Draws every asteroid with its rotated sprite.
+        """
+        cache = Actor.rotation_cache
+        intact = self.sprite_intact
+        destroyed = self.sprite_destroyed
+        n = self.count
+        x, y = self.positions(alpha)
+        window.blits([(cache.get(destroyed if dead else intact, rotation), position)
+                      for position, rotation, dead in zip(zip(x, y),
+                                                          self.rotation[:n].tolist(),
+                                                          self.destroyed[:n].tolist())],
+                     False)
+
+
+if __name__ == '__main__':
+
+    pygame.init()
+    window = pygame.display.set_mode((400, 300))
+
+    field = ObstacleField(None, capacity=2)
+    for i in range(5):
+        field.spawn(i * 50, 0, speed=3.5, move_x=-1.5, rotating_speed=1)
+    assert len(field) == 5 and field.capacity == 8
+
+    field.move()
+    assert field.x[0] == -1 and field.y[0] == 3
+    assert field.rotation[0] == 1
+
+    # drawn between the previous move and the last one
+    assert [position[0] for position in field.positions(0.0)] == [0, 0]
+    assert [position[0] for position in field.positions(0.5)] == [0, 2]
+    assert [position[0] for position in field.positions(1.0)] == [-1, 3]
+    assert field.rects(0.0)[1].topleft == (50, 0)
+    assert field.x[0] == -1 and field.y[0] == 3
+
+    # the first asteroid is at (-1, 3)
+    field.hitboxes = [Rect(5, 5, 29, 30)]
+    assert list(field.collide([Rect(0, 0, 10, 10)])) == [0]
+    assert list(field.collide([Rect(100, 100, 10, 10), Rect(30, 30, 5, 5)])) == [0]
+    # the corner of the bounding box is empty
+    field.hitboxes = [Rect(5, 5, 5, 30), Rect(5, 5, 29, 5)]
+    assert len(field.collide([Rect(20, 20, 5, 5)])) == 0
+    field.destroy(field.collide([Rect(0, 0, 10, 10)]))
+    assert len(field.collide([Rect(0, 0, 10, 10)])) == 0
+
+    # pixel perfect: the center of an asteroid is solid, not its corner
+    dot = Surface((2, 2))
+    assert field.collide_pixels(dot, (field.x[1] + 20, field.y[1] + 20)) == [1]
+    assert field.collide_pixels(dot, (field.x[1], field.y[1])) == []
+
+    field.draw(window)
+
+    field.x[1] = 500
+    assert field.cull(400, 300) == 1
+    assert len(field) == 4
+    assert field.destroyed[0] and field.x[1] == 99
@@ -13,6 +13,9 @@ from pygame.surface import Surface
 from pygame.rect import Rect
 
 from actor import Actor
+from assets import ASSETS
+from effects import Effects
+from hitboxes import HITBOXES
 from playercontroller import Player_Controller
 
 PLAYER_COUNT = 0
@@ -46,8 +49,10 @@ class Player(Actor):
     # old move action
     old_action = -1
 
-    # backups
+    # speed without the items' effects
     old_speed = speed
+    # the items' effects on the player
+    effects = None
 
     score = 0
 
@@ -56,12 +61,9 @@ class Player(Actor):
         # Create actor
         
         self.pid = len(master.players) % MAX_COLORS + 1
-        self.sprite_idle = pygame.image.load("resources" + os.path.sep +\
-         "player_{}_idle.png".format(self.pid))
-        self.sprite_left = pygame.image.load("resources" + os.path.sep +\
-         "player_{}_left.png".format(self.pid))
-        self.sprite_right = pygame.image.load("resources" + os.path.sep +\
-         "player_{}_right.png".format(self.pid))
+        self.sprite_idle = ASSETS.image("player_{}_idle.png".format(self.pid))
+        self.sprite_left = ASSETS.image("player_{}_left.png".format(self.pid))
+        self.sprite_right = ASSETS.image("player_{}_right.png".format(self.pid))
 
         Actor.__init__(self, master, self.sprite_idle, x, y)
 
@@ -70,29 +72,18 @@ class Player(Actor):
         self.rect.x = x
         self.rect.y = y
 
-        # original collision boxes
+        # original collision boxes, generated from the sprite (see hitboxes.py)
         # They are used for hitbox update when moving
-        self.orig_hitboxes = [
-            Rect(17, 30, 6, 4), # check front collision first
-            Rect(15, 23, 9, 7),
-            Rect(11, 15, 18, 8),
-            Rect(7, 7, 26, 8),
-            Rect(3, 0, 34, 7)
-        ]
-
-        self.hitboxes = [
-            Rect(17, 30, 6, 4),
-            Rect(15, 23, 9, 7),
-            Rect(11, 15, 18, 8),
-            Rect(7, 7, 26, 8),
-            Rect(3, 0, 34, 7)
-        ]
+        self.orig_hitboxes = HITBOXES.rects("player_{}_idle.png".format(self.pid))
+        self.hitboxes = [Rect(hitbox) for hitbox in self.orig_hitboxes]
 
         self.update_hitboxes()
 
         # player controller
         self.controller = Player_Controller(self)
 
+        self.effects = Effects(self)
+
     def configure_controller(self, key_up: int, key_left: int, 
                              key_down: int, key_right: int) -> None:
         """
@@ -128,14 +119,14 @@ class Player(Actor):
         Actor.move(self, direction)
         self.old_action = direction
 
-    def make_action(self):
+    def make_action(self, mask: int = None):
         """
-        Let the player make an action.
+        Let the player make an action, from its input mask if given.
         """
         if not self.configured_controller:
             print("Controller not configured for player.")
         else:
-            self.controller.make_action()
+            self.controller.make_action(mask)
 
     def is_alive(self):
         """
@@ -158,7 +149,9 @@ class Player(Actor):
         """
         self.alive = False
         self.can_collide = False
-        self.speed = 1
+        # a dead player falls slowly, whatever the effects
+        self.old_speed = 1
+        self.effects.clear()
         self.score = int(self.game_master.avoided)
 
     def cancel_action(self):
@@ -173,13 +166,21 @@ class Player(Actor):
 
     def copy(self):
         """
-        Make a copy of the player
-        """
-        copy = Player(self.game_master, self.rect.x, self.rect.y)
-        copy.alive = self.alive
-        copy.controller = self.controller
-        copy.configured_controller = self.configured_controller
-        copy.old_action = self.old_action
+        Make a copy of the player, sharing its images.
+        The copy has its own controller and effects, so that moving
+        or killing it doesn't change the player.
+        """
+        copy = Actor.copy(self)
+        controller = self.controller
+        if controller is not None:
+            copy.controller = controller.__class__.__new__(controller.__class__)
+            copy.controller.__dict__.update(controller.__dict__)
+            copy.controller.master = copy
+        if self.effects is not None:
+            copy.effects = Effects(copy)
+            copy.effects.modifiers.update(self.effects.modifiers)
+            copy.effects.speed_factor = self.effects.speed_factor
+            copy.effects.inverted = self.effects.inverted
         return copy
 
 if __name__ == '__main__':
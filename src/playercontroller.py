@@ -9,6 +9,8 @@ Ludum Dare 41
 
 import pygame
 
+from inputs import UP, LEFT, DOWN, RIGHT, input_mask
+
 class Player_Controller(object):
     """
     Allows a human player to control the character
@@ -23,7 +25,7 @@ class Player_Controller(object):
     key_down = -1
     key_right = -1
 
-    # back up for item effects
+    # keys without the items' effects
     old_key_up = -1
     old_key_down = -1
     old_key_right = -1
@@ -32,19 +34,33 @@ class Player_Controller(object):
     def __init__(self, player_master):
         self.master = player_master
 
-    def make_action(self):
+    def make_action(self, mask: int = None):
         """
-        Checks for player inputs and returns them
+        Moves the player according to its input mask of the frame,
+        sampled by the game (see inputs.py). Without mask, the
+        keyboard is read.
         """
-        keys = pygame.key.get_pressed()
+        if mask is None:
+            mask = input_mask(self.master, pygame.key.get_pressed())
+        self.apply_mask(mask)
 
-        if keys[self.key_up]:
+    def apply_mask(self, mask: int) -> None:
+        """
+        Moves the player according to an input mask. The mask gives
+        the pressed keys, which then move the player through the
+        current keys, i.e. with the items' effects.
+        """
+        pressed = (self.old_key_up if mask & UP else None,
+                   self.old_key_left if mask & LEFT else None,
+                   self.old_key_down if mask & DOWN else None,
+                   self.old_key_right if mask & RIGHT else None)
+        if self.key_up in pressed:
             self.master.move(1)
-        if keys[self.key_left]:
+        if self.key_left in pressed:
             self.master.move(2)
-        if keys[self.key_down]:
+        if self.key_down in pressed:
             self.master.move(3)
-        if keys[self.key_right]:
+        if self.key_right in pressed:
             self.master.move(0)
 
 if __name__ == '__main__':
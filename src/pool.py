@@ -0,0 +1,89 @@
+"""
+Pool module.
+Keeps the actors which left the game to reuse them, so that
+spawning doesn't create new objects.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+
+class ActorPool(object):
+    """
+    Pool of the actors of a class.
+    The pooled actors must have a reset(x, y) method putting them
+    back in the state of a new actor created at (x, y).
+    """
+
+    def __init__(self, factory: type):
+        self.factory = factory
+
+        # released actors, ready to be reused
+        self.free = []
+        # number of actors in use
+        self.live = 0
+        # maximum number of actors in use at the same time
+        self.high_water = 0
+        # number of actors created by the pool
+        self.created = 0
+
+    def acquire(self, master: "Game", x: int = 0, y: int = 0) -> "Actor":
+        """
+        Returns an actor placed at (x, y), reused if possible.
+        """
+        if self.free:
+            actor = self.free.pop()
+            actor.reset(x, y)
+        else:
+            actor = self.factory(master, x, y)
+            self.created += 1
+
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return actor
+
+    def release(self, actor: "Actor") -> None:
+        """
+        Gives back an actor which is no longer used by the game.
+        """
+        self.free.append(actor)
+        self.live -= 1
+
+    def release_all(self, actors: "list of Actor") -> None:
+        """
+        Gives back several actors.
+        """
+        self.free.extend(actors)
+        self.live -= len(actors)
+
+    def size(self) -> int:
+        """
+        Returns the number of actors owned by the pool, used or not.
+        """
+        return self.live + len(self.free)
+
+
+if __name__ == '__main__':
+
+    class Dummy(object):
+
+        def __init__(self, master, x, y):
+            self.reset(x, y)
+
+        def reset(self, x, y):
+            self.position = (x, y)
+
+    pool = ActorPool(Dummy)
+    first = pool.acquire(None, 1, 2)
+    second = pool.acquire(None, 3, 4)
+    assert (pool.live, pool.high_water, pool.created) == (2, 2, 2)
+
+    pool.release(first)
+    assert pool.acquire(None, 5, 6) is first
+    assert first.position == (5, 6)
+    assert pool.created == 2
+
+    pool.release_all([first, second])
+    assert (pool.live, pool.size(), pool.high_water) == (0, 2, 2)
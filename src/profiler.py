@@ -0,0 +1,219 @@
+"""
+Profiler module.
+Measures the time spent in each phase of the frames.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import csv
+import json
+import time
+from array import array
+from collections import OrderedDict
+
+import pygame
+from pygame.font import Font
+from pygame.surface import Surface
+
+
+class FrameProfiler(object):
+    """
+    Times the phases of each frame with a monotonic clock.
+    The game calls start_frame() at the beginning of a frame, then
+    mark(phase) at the end of each phase: the phase gets the time
+    elapsed since the previous mark. The durations of the last
+    frames are kept in ring buffers, to compute percentiles.
+    """
+
+    enabled = True
+    # number of frames kept for the percentiles
+    history = 600
+    # frames between two refreshes of the overlay
+    overlay_refresh = 30
+
+    def __init__(self, history: int = None, overlay: bool = False, trace: bool = False):
+        if history is not None:
+            self.history = history
+        self.overlay = overlay
+
+        # phase -> ring buffer of durations in s
+        self.phases = OrderedDict()
+        # durations of the current frame
+        self.current = OrderedDict()
+        # last values of the gauges (i.e. pools' sizes)
+        self.gauges = OrderedDict()
+        self.index = 0
+        self.frames = 0
+        self.last = time.perf_counter()
+        self.frame_start = self.last
+
+        # all the frames' durations, when tracing
+        self.trace = [] if trace else None
+
+        self.overlay_surface = None
+
+    def start_frame(self) -> None:
+        """
+        Starts timing a new frame.
+        """
+        self.current.clear()
+        self.last = self.frame_start = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """
+        Ends a phase, which lasted since the previous mark.
+        """
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def gauge(self, name: str, value: float) -> None:
+        """
+        Records the current value of a quantity.
+        """
+        self.gauges[name] = value
+
+    def end_frame(self) -> None:
+        """
+        Stores the durations of the frame.
+        """
+        self.current["frame"] = time.perf_counter() - self.frame_start
+
+        for phase, duration in self.current.items():
+            buffer = self.phases.get(phase)
+            if buffer is None:
+                buffer = array("d", [0.0]) * self.history
+                self.phases[phase] = buffer
+            buffer[self.index] = duration
+        # phases skipped this frame
+        for phase, buffer in self.phases.items():
+            if phase not in self.current:
+                buffer[self.index] = 0.0
+
+        if self.trace is not None:
+            record = OrderedDict(self.current)
+            record.update(self.gauges)
+            self.trace.append(record)
+
+        self.index = (self.index + 1) % self.history
+        self.frames += 1
+
+    def percentiles(self, phase: str, points: tuple = (50, 95, 99)) -> tuple:
+        """
+        Returns the percentiles of a phase's durations over the last
+        frames, in s.
+        """
+        buffer = self.phases.get(phase)
+        count = min(self.frames, self.history)
+        if buffer is None or count == 0:
+            return tuple(0.0 for _ in points)
+        if count < self.history:
+            values = sorted(buffer[:count])
+        else:
+            values = sorted(buffer)
+        return tuple(values[min(count - 1, int(count * point / 100.0))] for point in points)
+
+    def summary(self) -> "OrderedDict":
+        """
+        Returns the p50/p95/p99 of every phase, in ms.
+        """
+        summary = OrderedDict()
+        for phase in self.phases:
+            p50, p95, p99 = self.percentiles(phase)
+            summary[phase] = OrderedDict([("p50", p50 * 1000.0), ("p95", p95 * 1000.0),
+                                          ("p99", p99 * 1000.0)])
+        return summary
+
+    def draw_overlay(self, window: Surface, font: Font) -> None:
+        """
+        Draws the phases' percentiles at the top left of the window.
+        """
+        if self.overlay_surface is None or self.frames % self.overlay_refresh == 0:
+            lines = ["{:<20} {:6.2f} {:6.2f} {:6.2f}".format(phase, *values.values())
+                     for phase, values in self.summary().items()]
+            lines += ["{:<20} {}".format(name, value) for name, value in self.gauges.items()]
+            height = font.get_linesize()
+            self.overlay_surface = Surface((window.get_width(), height * len(lines) + 4))
+            self.overlay_surface.set_alpha(180)
+            for i, line in enumerate(lines):
+                self.overlay_surface.blit(font.render(line, False, (255, 255, 0)),
+                                          (2, 2 + i * height))
+        window.blit(self.overlay_surface, (0, 0))
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the traced frames to a file, as CSV or as JSON
+        depending on the extension. Durations are in s.
+        """
+        frames = self.trace if self.trace is not None else []
+        if path.endswith(".json"):
+            with open(path, "w") as trace_file:
+                json.dump({"summary" : self.summary(), "frames" : frames}, trace_file)
+            return
+
+        columns = []
+        for record in frames:
+            for name in record:
+                if name not in columns:
+                    columns.append(name)
+        with open(path, "w", newline="") as trace_file:
+            writer = csv.DictWriter(trace_file, columns, restval=0)
+            writer.writeheader()
+            writer.writerows(frames)
+
+
+class NullProfiler(object):
+    """
+    Profiler doing nothing, used when profiling is disabled.
+    """
+
+    enabled = False
+    overlay = False
+
+    def start_frame(self) -> None:
+        pass
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def gauge(self, name: str, value: float) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+
+if __name__ == '__main__':
+
+    import os
+    import tempfile
+
+    profiler = FrameProfiler(history=10, trace=True)
+    for i in range(20):
+        profiler.start_frame()
+        time.sleep(0.001)
+        profiler.mark("sleep")
+        if i % 2:
+            profiler.mark("odd")
+        profiler.gauge("counter", i)
+        profiler.end_frame()
+
+    p50, p95, p99 = profiler.percentiles("sleep")
+    assert 0.001 <= p50 <= p95 <= p99
+    assert profiler.percentiles("unknown") == (0.0, 0.0, 0.0)
+    assert list(profiler.summary()) == ["sleep", "frame", "odd"]
+    assert len(profiler.trace) == 20 and profiler.trace[-1]["counter"] == 19
+
+    folder = tempfile.mkdtemp()
+    profiler.dump(os.path.join(folder, "trace.csv"))
+    profiler.dump(os.path.join(folder, "trace.json"))
+    with open(os.path.join(folder, "trace.json")) as trace_file:
+        assert len(json.load(trace_file)["frames"]) == 20
+
+    pygame.init()
+    window = pygame.display.set_mode((400, 300))
+    profiler.draw_overlay(window, pygame.font.Font(None, 14))
+
+    NullProfiler().mark("nothing")
@@ -0,0 +1,300 @@
+"""
+Replay module.
+Records the players' inputs of a round into a compact binary file,
+and plays it back.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import bisect
+import mmap
+import queue
+import struct
+import threading
+import zlib
+
+import pygame
+
+from inputs import ManualSource
+from snapshot import GameSnapshot, snapshot, restore, encode, decode
+
+# File layout (little endian):
+#   header   : magic, version, number of players, fps, keyframes interval, seed
+#   blocks   : keyframes ("K", compressed snapshot.encode) and runs of
+#              frames inputs ("I")
+#   index    : (frame, offset) of every keyframe
+#   footer   : number of keyframes, number of frames, index offset, magic
+MAGIC = b"SYAR"
+INDEX_MAGIC = b"SYAX"
+VERSION = 3
+HEADER = struct.Struct("<4sBBHIq")
+KEYFRAME = struct.Struct("<cII")
+INPUTS = struct.Struct("<cH")
+INDEX_ENTRY = struct.Struct("<IQ")
+FOOTER = struct.Struct("<IIQ4s")
+
+def pack_masks(masks: "list of int") -> bytes:
+    """
+    Packs the players' masks, 4 bits per player.
+    """
+    packed = bytearray((len(masks) + 1) // 2)
+    for i, mask in enumerate(masks):
+        packed[i // 2] |= (mask & 0xF) << (4 * (i % 2))
+    return bytes(packed)
+
+
+def unpack_masks(data: bytes, nb_of_players: int) -> list:
+    """
+    Unpacks the players' masks.
+    """
+    return [(data[i // 2] >> (4 * (i % 2))) & 0xF for i in range(nb_of_players)]
+
+
+class ReplayWriter(object):
+    """
+    Writes a replay file. The file is written by a background
+    thread, the game only queues the data.
+    A keyframe holding the whole game state is written every
+    keyframe_interval frames, the other frames only store the
+    players' inputs (4 bits per player).
+    """
+
+    # number of frames between two keyframes
+    keyframe_interval = 600
+    # number of frames inputs sent at once to the writing thread
+    flush_interval = 60
+
+    def __init__(self, path: str, game: "Game", keyframe_interval: int = None):
+        if keyframe_interval is not None:
+            self.keyframe_interval = keyframe_interval
+
+        self.game = game
+        self.file = open(path, "wb")
+        self.queue = queue.Queue()
+        self.index = []
+        self.frames = 0
+        # frame of the last keyframe
+        self.keyframe = None
+
+        # inputs not sent to the thread yet
+        self.pending = bytearray()
+        self.pending_frames = 0
+
+        seed = game.seed if game.seed is not None else -1
+        self.file.write(HEADER.pack(MAGIC, VERSION, game.nb_of_players, game.FPS,
+                                    self.keyframe_interval, seed))
+
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def begin_frame(self) -> None:
+        """
+        Captures the game state if the next frame needs a keyframe.
+        Must be called before the game update of the frame.
+        """
+        if self.frames % self.keyframe_interval == 0 and self.keyframe != self.frames:
+            self.flush()
+            # the state is captured now, encoded by the thread
+            self.queue.put(("K", self.frames, snapshot(self.game)))
+            self.keyframe = self.frames
+
+    def record_frame(self, masks: "list of int") -> None:
+        """
+        Records the inputs of the next frame. Must be called before
+        the game update using these inputs, or during it after
+        begin_frame.
+        """
+        self.begin_frame()
+
+        self.pending += pack_masks(masks)
+        self.pending_frames += 1
+        self.frames += 1
+
+        if self.pending_frames >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Sends the pending inputs to the thread.
+        """
+        if self.pending_frames:
+            self.queue.put(("I", self.pending_frames, bytes(self.pending)))
+            self.pending = bytearray()
+            self.pending_frames = 0
+
+    def write_loop(self) -> None:
+        """
+        Writing thread: writes the queued blocks until None is received.
+        """
+        while True:
+            block = self.queue.get()
+            if block is None:
+                break
+            kind, count, data = block
+            if kind == "K":
+                self.index.append((count, self.file.tell()))
+                payload = zlib.compress(encode(data))
+                self.file.write(KEYFRAME.pack(b"K", count, len(payload)))
+                self.file.write(payload)
+            else:
+                self.file.write(INPUTS.pack(b"I", count))
+                self.file.write(data)
+
+    def close(self) -> None:
+        """
+        Writes the remaining data and the index, then closes the file.
+        """
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+        index_offset = self.file.tell()
+        for frame, offset in self.index:
+            self.file.write(INDEX_ENTRY.pack(frame, offset))
+        self.file.write(FOOTER.pack(len(self.index), self.frames, index_offset, INDEX_MAGIC))
+        self.file.close()
+
+
+class Replay(object):
+    """
+    Reads a replay file. The file is memory mapped, and the index
+    of the keyframes allows to jump to any frame by restoring the
+    previous keyframe and simulating the few frames after it.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as replay_file:
+            self.data = mmap.mmap(replay_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.nb_of_players, self.fps,
+         self.keyframe_interval, seed) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a replay file".format(path))
+        self.seed = seed if seed >= 0 else None
+
+        keyframes, self.frames, index_offset, magic = FOOTER.unpack_from(
+            self.data, len(self.data) - FOOTER.size)
+        if magic != INDEX_MAGIC:
+            raise ValueError("{} is not a complete replay file".format(path))
+
+        self.index = [INDEX_ENTRY.unpack_from(self.data, index_offset + i * INDEX_ENTRY.size)
+                      for i in range(keyframes)]
+        self.index_frames = [frame for frame, _ in self.index]
+        self.index_offset = index_offset
+        self.mask_size = (self.nb_of_players + 1) // 2
+        # source of the inputs given to step()
+        self.source = ManualSource()
+
+    def keyframe_at(self, frame: int) -> (int, int):
+        """
+        Returns the (frame, offset) of the last keyframe before the given frame.
+        """
+        return self.index[bisect.bisect_right(self.index_frames, frame) - 1]
+
+    def read_keyframe(self, offset: int) -> (GameSnapshot, int):
+        """
+        Returns the state stored at the given offset, and the offset
+        of the following block.
+        """
+        _, _, size = KEYFRAME.unpack_from(self.data, offset)
+        start = offset + KEYFRAME.size
+        state = decode(zlib.decompress(self.data[start:start + size]))
+        return state, start + size
+
+    def inputs(self, offset: int) -> "iterator of list of int":
+        """
+        Iterates over the frames' inputs stored after the given offset.
+        """
+        while offset < self.index_offset:
+            kind = self.data[offset:offset + 1]
+            if kind == b"K":
+                _, _, size = KEYFRAME.unpack_from(self.data, offset)
+                offset += KEYFRAME.size + size
+                continue
+            _, count = INPUTS.unpack_from(self.data, offset)
+            offset += INPUTS.size
+            for _ in range(count):
+                yield unpack_masks(self.data[offset:offset + self.mask_size],
+                                   self.nb_of_players)
+                offset += self.mask_size
+
+    def seek(self, game: "Game", frame: int) -> "iterator of list of int":
+        """
+        Puts the game in the state it had at the given frame, from 0
+        to the number of recorded frames. Returns the inputs of the
+        following frames.
+        """
+        if not 0 <= frame <= self.frames:
+            raise ValueError("frame {} is not in the replay, which has frames 0 to {}".format(
+                frame, self.frames))
+        key_frame, offset = self.keyframe_at(frame)
+        state, offset = self.read_keyframe(offset)
+        restore(game, state)
+
+        inputs = self.inputs(offset)
+        for _ in range(frame - key_frame):
+            self.step(game, next(inputs))
+        return inputs
+
+    def step(self, game: "Game", masks: "list of int") -> bool:
+        """
+        Computes the next frame with the given inputs.
+        """
+        game.input_source = self.source
+        self.source.set(masks)
+        return game.update()
+
+    def close(self) -> None:
+        self.data.close()
+
+
+if __name__ == '__main__':
+
+    import os
+    import tempfile
+    from inputs import input_mask
+    from simulation import Simulation
+
+    inputs = lambda game, frame: [pygame.K_a] if frame % 80 < 40 else [pygame.K_RIGHT, pygame.K_w]
+    sim = Simulation(2, inputs, seed=7)
+    game = sim.game
+
+    path = os.path.join(tempfile.mkdtemp(), "test.rep")
+    writer = ReplayWriter(path, game, keyframe_interval=100)
+    digests = [game.state_digest()]
+    for i in range(450):
+        keys = inputs(game, game.frame + 1)
+        sim.keys.set(keys)
+        writer.record_frame([input_mask(player, sim.keys) for player in game.players])
+        game.update()
+        digests.append(game.state_digest())
+    writer.close()
+
+    replay = Replay(path)
+    assert replay.frames == 450
+    assert replay.seed == 7
+    assert [frame for frame, _ in replay.index] == [0, 100, 200, 300, 400]
+    # a few bytes per frame
+    assert os.path.getsize(path) < 450 * 50
+
+    # seeking restores the exact frame
+    for frame in (0, 99, 100, 250, 449, 450):
+        replay.seek(game, frame)
+        assert game.state_digest() == digests[frame]
+    assert next(replay.seek(game, 450), None) is None
+    for frame in (-1, 451):
+        try:
+            replay.seek(game, frame)
+            assert False
+        except ValueError:
+            pass
+
+    # and playing from there gives the recorded frames
+    inputs = replay.seek(game, 120)
+    for frame in range(121, 451):
+        replay.step(game, next(inputs))
+        assert game.state_digest() == digests[frame]
+
+    replay.close()
@@ -0,0 +1,154 @@
+"""
+Rotation cache module.
+Stores pre-rotated copies of the sprites so that spinning
+actors don't have to rotate their image every frame.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+from collections import OrderedDict
+
+import pygame
+from pygame.surface import Surface
+
+
+class RotationCache(object):
+    """
+    Caches rotated versions of source images, keyed by
+    (source image, quantized angle).
+    The rotated images keep the size of the source image
+    (the corners going out of the frame are cut), like
+    Actor.rotate always did.
+    """
+
+    # angular resolution in degrees
+    resolution = 2
+    # maximum memory used by the cached images, in bytes
+    max_bytes = 16 * 1024 * 1024
+
+    def __init__(self, resolution: float = None, max_bytes: int = None):
+        if resolution is not None:
+            self.resolution = resolution
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+        # (source, angle index) -> rotated surface, least recently used first
+        self.frames = OrderedDict()
+        self.used_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def steps(self) -> int:
+        """
+        Number of different angles stored for one image.
+        """
+        return max(1, int(round(360.0 / self.resolution)))
+
+    def quantize(self, angle: float) -> int:
+        """
+        Returns the index of the cached angle the closest to
+        the given angle.
+        """
+        steps = self.steps()
+        return int(round(angle * steps / 360.0)) % steps
+
+    def get(self, source: Surface, angle: float) -> Surface:
+        """
+        Returns the source image rotated by the given angle.
+        The returned surface is shared and must not be modified.
+        """
+        key = (source, self.quantize(angle))
+        frame = self.frames.get(key)
+
+        if frame is not None:
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+        frame = self.render(source, key[1] * 360.0 / self.steps())
+        self.store(key, frame)
+        return frame
+
+    def build(self, source: Surface) -> None:
+        """
+        Renders every angle of the given image at once.
+        Can be called at load time to avoid the first rotations
+        being computed during the game.
+        """
+        for idx in range(self.steps()):
+            key = (source, idx)
+            if key not in self.frames:
+                self.store(key, self.render(source, idx * 360.0 / self.steps()))
+
+    def render(self, source: Surface, angle: float) -> Surface:
+        """
+        Rotates an image while keeping its center and size.
+        """
+        orig_rect = source.get_rect()
+        rot_image = pygame.transform.rotate(source, angle)
+        rot_rect = orig_rect.copy()
+        rot_rect.center = rot_image.get_rect().center
+        frame = rot_image.subsurface(rot_rect).copy()
+        # Keep the frames in the display format for fast blits
+        if pygame.display.get_surface() is not None:
+            frame = frame.convert_alpha()
+        return frame
+
+    def store(self, key, frame: Surface) -> None:
+        """
+        Stores a frame and evicts the least recently used ones
+        if the memory cap is reached.
+        """
+        size = self.frame_size(frame)
+        # An image bigger than the whole cache is never stored
+        if size > self.max_bytes:
+            return
+
+        while self.frames and self.used_bytes + size > self.max_bytes:
+            _, old = self.frames.popitem(last=False)
+            self.used_bytes -= self.frame_size(old)
+
+        self.frames[key] = frame
+        self.used_bytes += size
+
+    def frame_size(self, frame: Surface) -> int:
+        """
+        Memory used by a frame, in bytes.
+        """
+        return frame.get_pitch() * frame.get_height()
+
+    def clear(self) -> None:
+        """
+        Empties the cache.
+        """
+        self.frames.clear()
+        self.used_bytes = 0
+
+
+if __name__ == '__main__':
+
+    pygame.init()
+    pygame.display.set_mode((400, 300))
+
+    surf = Surface((40, 40)).convert_alpha()
+    cache = RotationCache(resolution=90)
+    assert cache.steps() == 4
+    assert cache.quantize(44) == 0
+    assert cache.quantize(46) == 1
+    assert cache.quantize(-90) == 3
+    rotated = cache.get(surf, 90)
+    assert rotated.get_size() == surf.get_size()
+    assert cache.get(surf, 91) is rotated
+    assert cache.hits == 1 and cache.misses == 1
+    cache.build(surf)
+    assert len(cache.frames) == 4
+
+    # memory cap
+    cache = RotationCache(resolution=90, max_bytes=cache.frame_size(rotated) * 2)
+    cache.build(surf)
+    assert len(cache.frames) == 2
+    assert cache.used_bytes <= cache.max_bytes
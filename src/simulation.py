@@ -0,0 +1,200 @@
+"""
+Simulation module.
+Runs the game without window nor drawing, as fast as possible,
+on a simulated clock. Used for tests, bots and benchmarks.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import os
+
+from inputs import KeyboardSource
+
+
+def use_dummy_drivers() -> None:
+    """
+    Makes SDL use its dummy video and audio drivers, unless other
+    drivers were explicitly asked. Must be called before pygame
+    is initialized.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+class KeyState(object):
+    """
+    Keys state replacing the keyboard, indexable by key ID
+    like pygame.key.get_pressed().
+    """
+
+    def __init__(self, pressed: "iterable of int" = ()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.pressed
+
+    def set(self, pressed: "iterable of int") -> None:
+        """
+        Replaces the pressed keys.
+        """
+        self.pressed.clear()
+        self.pressed.update(pressed)
+
+
+class Simulation(object):
+    """
+    Steps a headless Game on a fixed timestep.
+    Each step advances the game time of 1/FPS s whatever the
+    time it took to compute. The pressed keys are given by the
+    inputs: either a function (game, frame) -> pressed keys, or
+    a list giving the pressed keys of each frame.
+    With a seed, two simulations given the same inputs compute
+    exactly the same frames.
+    """
+
+    def __init__(self, nb_of_players: int = 2, inputs=None, game: "Game" = None,
+                 seed: int = None):
+        use_dummy_drivers()
+        # imported after the drivers choice
+        from game import Game
+
+        self.game = game if game is not None else Game(seed)
+        if seed is not None:
+            self.game.seed = seed
+        self.game.headless = True
+        self.game.fixed_timestep = True
+
+        self.keys = KeyState()
+        self.game.input_source = KeyboardSource(self.keys)
+        self.inputs = inputs
+
+        self.reset(nb_of_players)
+
+    def reset(self, nb_of_players: int = None, seed: int = None) -> None:
+        """
+        Starts a new round, with a new seed if given.
+        """
+        if seed is not None:
+            self.game.seed = seed
+        if nb_of_players is not None:
+            self.game.nb_of_players = nb_of_players
+        self.game.create_players(self.game.nb_of_players)
+        self.game.reset_round()
+        self.ended = False
+
+    def next_inputs(self) -> "iterable of int":
+        """
+        Returns the keys pressed during the next frame.
+        """
+        frame = self.game.frame
+        if self.inputs is None:
+            return ()
+        if callable(self.inputs):
+            return self.inputs(self.game, frame + 1)
+        if frame < len(self.inputs):
+            return self.inputs[frame]
+        return ()
+
+    def step(self, pressed: "iterable of int" = None) -> bool:
+        """
+        Computes one frame. The pressed keys can be given,
+        otherwise they are read from the inputs.
+        Returns whether the game is ended.
+        """
+        profiler = self.game.profiler
+        profiler.start_frame()
+        self.keys.set(self.next_inputs() if pressed is None else pressed)
+        profiler.mark("inputs")
+        if self.game.update():
+            self.ended = True
+        profiler.end_frame()
+        return self.ended
+
+    def run(self, frames: int = None) -> int:
+        """
+        Runs the given number of frames, or until the end of the
+        game. Returns the number of computed frames.
+        """
+        done = 0
+        while (frames is None or done < frames) and not self.ended:
+            self.step()
+            done += 1
+        return done
+
+
+if __name__ == '__main__':
+
+    import pygame
+
+    sim = Simulation(2, inputs=[[pygame.K_d]] * 10)
+    player = sim.game.players[0]
+    x_pos = player.rect.x
+
+    assert sim.run(10) == 10
+    assert player.rect.x == x_pos + 10 * player.speed
+    assert sim.game.frame == 10
+    assert abs(sim.game.now() - 10.0 / sim.game.FPS) < 1e-9
+
+    # inputs from a function
+    sim = Simulation(1, inputs=lambda game, frame: [pygame.K_LEFT] if frame % 2 else [])
+    player = sim.game.players[0]
+    x_pos = player.rect.x
+    sim.run(4)
+    assert player.rect.x == x_pos - 2 * player.speed
+
+    # same seed, same inputs: same frames
+    inputs = lambda game, frame: [pygame.K_LEFT] if frame % 50 < 25 else [pygame.K_RIGHT]
+    sim_a = Simulation(1, inputs, seed=42)
+    digests = []
+    for i in range(600):
+        sim_a.step()
+        digests.append(sim_a.game.state_digest())
+    sim_b = Simulation(1, inputs, game=sim_a.game, seed=42)
+    for i in range(600):
+        sim_b.step()
+        assert sim_b.game.state_digest() == digests[i]
+    # an existing game keeps its seed
+    sim_c = Simulation(1, inputs, game=sim_a.game)
+    assert sim_c.game.seed == 42
+    sim_c.step()
+    assert sim_c.game.state_digest() == digests[0]
+
+    # drawn between the last two ticks, then put back
+    sim = Simulation(1, inputs=[[pygame.K_RIGHT]] * 10)
+    game = sim.game
+    player = game.players[0]
+    obstacle = game.obstacle_pool.acquire(game, 100, 100)
+    game.obstacles.append(obstacle)
+    drawn = []
+    game.draw_full = lambda: drawn.append((player.rect.x, obstacle.rect.y))
+    x_pos, y_pos = player.rect.x, obstacle.rect.y
+    game.store_positions()
+    sim.step()
+    rects = (tuple(player.rect), tuple(obstacle.rect))
+    for alpha in (0.0, 0.5, 1.0):
+        game.draw(alpha)
+        assert (tuple(player.rect), tuple(obstacle.rect)) == rects
+    moved_x, moved_y = player.rect.x - x_pos, obstacle.rect.y - y_pos
+    assert moved_x > 0 and moved_y > 0
+    assert drawn == [(x_pos, y_pos),
+                     (int(round(x_pos + moved_x / 2.0)), int(round(y_pos + moved_y / 2.0))),
+                     (x_pos + moved_x, y_pos + moved_y)]
+
+    # an obstacle taken again from the pool during the tick is not drawn on its way
+    game.store_positions()
+    sim.step()
+    game.obstacles.remove(obstacle)
+    game.obstacle_pool.release(obstacle)
+    assert game.obstacle_pool.acquire(game, obstacle.rect.x + 200, -40) is obstacle
+    game.obstacles.append(obstacle)
+    del drawn[:]
+    game.draw(0.5)
+    assert drawn[0][1] == -40
+
+    # the game ends when every player is dead
+    for player in sim.game.players:
+        player.kill()
+    assert sim.step()
+    assert sim.run() == 0
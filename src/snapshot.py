@@ -0,0 +1,500 @@
+"""
+Snapshot module.
+Captures the whole state of a round in small records holding plain
+values (no surfaces), and puts a game back in a captured state.
+Used for the replay keyframes, rollbacks and the bots' lookahead.
+The snapshots are encoded as plain values too, so that reading one
+from a file cannot run any code.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import struct
+
+from actor import Actor
+from items import ITEM_CLASSES
+
+# Poses of the players' sprites
+IDLE = 0
+LEFT = 1
+RIGHT = 2
+
+# Arrays of the obstacle field
+FIELD_ARRAYS = ("x", "y", "move_x", "speed", "rotation", "rotating_speed", "destroyed")
+# Types of the encoded arrays (little endian)
+FIELD_TYPES = {name : "<f8" for name in FIELD_ARRAYS}
+FIELD_TYPES["destroyed"] = "?"
+
+# Values of a snapshot other than its records, in encoding order
+SCALARS = ("nb_of_players", "frame", "sim_time", "avoided", "end_time",
+           "obstacles_last_spawn", "obstacles_spawn_rate", "item_last_spawn",
+           "background_y", "rng_state", "field_count")
+
+# Tags of the encoded values, followed by:
+#   int   : int64
+#   float : float64
+#   text  : length (uint32), UTF-8 bytes
+#   tuple : length (uint32), values
+NONE, FALSE, TRUE, INT, FLOAT, TEXT, TUPLE = b"n", b"0", b"1", b"i", b"f", b"s", b"t"
+INT_VALUE = struct.Struct("<q")
+FLOAT_VALUE = struct.Struct("<d")
+LENGTH = struct.Struct("<I")
+
+
+class PlayerRecord(object):
+    """
+    State of a player.
+    """
+
+    __slots__ = ("x", "y", "lifes", "alive", "can_collide", "speed", "old_speed", "score",
+                 "old_action", "pose", "key_up", "key_left", "key_down", "key_right")
+
+
+class ObstacleRecord(object):
+    """
+    State of an obstacle.
+    """
+
+    __slots__ = ("x", "y", "move_x", "speed", "rotation", "rotating_speed", "destroyed")
+
+
+class ItemRecord(object):
+    """
+    State of an item. The activator is the index of a player, or -1.
+    """
+
+    __slots__ = ("cls", "x", "y", "time_alive_start", "enabled", "start", "activator", "used")
+
+
+class GameSnapshot(object):
+    """
+    State of a round.
+    A snapshot can be captured again into the same object, which
+    then reuses its records.
+    """
+
+    __slots__ = ("nb_of_players", "frame", "sim_time", "avoided", "end_time",
+                 "obstacles_last_spawn", "obstacles_spawn_rate", "item_last_spawn",
+                 "background_y", "rng_state", "players", "obstacles", "items",
+                 "activated_items", "field_count", "field")
+
+    def __init__(self):
+        self.players = []
+        self.obstacles = []
+        self.items = []
+        self.activated_items = []
+        self.field_count = 0
+        # name -> array, None without obstacle field
+        self.field = None
+
+
+def records(records: list, count: int, cls: type) -> list:
+    """
+    Resizes a list of records to count records, reusing the existing ones.
+    """
+    del records[count:]
+    while len(records) < count:
+        records.append(cls())
+    return records
+
+
+def snapshot(game: "Game", into: GameSnapshot = None) -> GameSnapshot:
+    """
+    Captures the state of a game, into the given snapshot if any.
+    """
+    snap = into if into is not None else GameSnapshot()
+
+    snap.nb_of_players = game.nb_of_players
+    snap.frame = game.frame
+    snap.sim_time = game.sim_time
+    snap.avoided = game.avoided
+    snap.end_time = game.end_time
+    snap.obstacles_last_spawn = game.obstacles_last_spawn
+    snap.obstacles_spawn_rate = game.obstacles_spawn_rate
+    snap.item_last_spawn = game.item_last_spawn
+    snap.background_y = game.background.rect.y
+    snap.rng_state = game.rng.getstate()
+
+    for player, record in zip(game.players, records(snap.players, len(game.players),
+                                                     PlayerRecord)):
+        record.x = player.rect.x
+        record.y = player.rect.y
+        record.lifes = player.lifes
+        record.alive = player.alive
+        record.can_collide = player.can_collide
+        record.speed = player.speed
+        record.old_speed = player.old_speed
+        record.score = player.score
+        record.old_action = player.old_action
+        if player.image is player.sprite_left:
+            record.pose = LEFT
+        elif player.image is player.sprite_right:
+            record.pose = RIGHT
+        else:
+            record.pose = IDLE
+        controller = player.controller
+        record.key_up = controller.key_up
+        record.key_left = controller.key_left
+        record.key_down = controller.key_down
+        record.key_right = controller.key_right
+
+    for obstacle, record in zip(game.obstacles, records(snap.obstacles, len(game.obstacles),
+                                                        ObstacleRecord)):
+        record.x = obstacle.rect.x
+        record.y = obstacle.rect.y
+        record.move_x = obstacle.move_x
+        record.speed = obstacle.speed
+        record.rotation = obstacle.rotation
+        record.rotating_speed = obstacle.rotating_speed
+        record.destroyed = obstacle.destroyed
+
+    players = game.players
+    for items, saved in ((game.items, snap.items),
+                         (game.activated_items, snap.activated_items)):
+        for item, record in zip(items, records(saved, len(items), ItemRecord)):
+            record.cls = type(item)
+            record.x = item.rect.x
+            record.y = item.rect.y
+            record.time_alive_start = item.time_alive_start
+            record.enabled = item.enabled
+            record.start = item.start
+            record.activator = players.index(item.activator) if item.activator in players\
+                else -1
+            record.used = getattr(item, "used", False)
+
+    field = game.obstacle_field
+    if field is None:
+        snap.field = None
+        snap.field_count = 0
+    else:
+        n = field.count
+        if snap.field is None:
+            snap.field = {}
+        for name in FIELD_ARRAYS:
+            source = getattr(field, name)
+            array = snap.field.get(name)
+            if array is None or len(array) < n:
+                array = source[:n].copy()
+                snap.field[name] = array
+            else:
+                array[:n] = source[:n]
+        snap.field_count = n
+
+    return snap
+
+
+def restore(game: "Game", snap: GameSnapshot) -> None:
+    """
+    Puts a game back in a captured state. The game's actors are
+    reused, the missing ones are taken from the pools.
+    """
+    game.frame = snap.frame
+    game.sim_time = snap.sim_time
+    game.avoided = snap.avoided
+    game.end_time = snap.end_time
+    game.obstacles_last_spawn = snap.obstacles_last_spawn
+    game.obstacles_spawn_rate = snap.obstacles_spawn_rate
+    game.item_last_spawn = snap.item_last_spawn
+    game.background.rect.y = snap.background_y
+
+    if len(game.players) != snap.nb_of_players:
+        game.nb_of_players = snap.nb_of_players
+        game.create_players(snap.nb_of_players)
+
+    for player, record in zip(game.players, snap.players):
+        player.rect.x = record.x
+        player.rect.y = record.y
+        player.lifes = record.lifes
+        player.alive = record.alive
+        player.can_collide = record.can_collide
+        player.speed = record.speed
+        player.old_speed = record.old_speed
+        player.score = record.score
+        player.old_action = record.old_action
+        if record.pose == LEFT:
+            player.image = player.sprite_left
+        elif record.pose == RIGHT:
+            player.image = player.sprite_right
+        else:
+            player.image = player.sprite_idle
+        controller = player.controller
+        controller.key_up = record.key_up
+        controller.key_left = record.key_left
+        controller.key_down = record.key_down
+        controller.key_right = record.key_right
+        player.update_hitboxes()
+
+    obstacles = game.obstacles
+    count = len(snap.obstacles)
+    if len(obstacles) > count:
+        game.obstacle_pool.release_all(obstacles[count:])
+        del obstacles[count:]
+    while len(obstacles) < count:
+        obstacles.append(game.obstacle_pool.acquire(game))
+    rotation_cache = Actor.rotation_cache
+    for obstacle, record in zip(obstacles, snap.obstacles):
+        obstacle.rect.x = record.x
+        obstacle.rect.y = record.y
+        obstacle.move_x = record.move_x
+        obstacle.speed = record.speed
+        obstacle.rotation = record.rotation
+        obstacle.rotating_speed = record.rotating_speed
+        obstacle.destroyed = record.destroyed
+        obstacle.can_collide = not record.destroyed
+        source = obstacle.sprite_destroyed if record.destroyed else obstacle.sprite_intact
+        obstacle.source_image = obstacle.orig_image = source
+        obstacle.image = rotation_cache.get(source, record.rotation)
+        obstacle.update_hitboxes()
+
+    for items, saved in ((game.items, snap.items),
+                         (game.activated_items, snap.activated_items)):
+        for i, record in enumerate(saved):
+            if i < len(items) and type(items[i]) is record.cls:
+                item = items[i]
+            else:
+                if i < len(items):
+                    game.release_item(items[i])
+                item = game.item_pool(record.cls).acquire(game)
+                if i < len(items):
+                    items[i] = item
+                else:
+                    items.append(item)
+            item.rect.x = record.x
+            item.rect.y = record.y
+            item.time_alive_start = record.time_alive_start
+            item.enabled = record.enabled
+            item.start = record.start
+            item.activator = game.players[record.activator] if record.activator >= 0 else None
+            item.used = record.used
+            item.update_hitboxes()
+        for item in items[len(saved):]:
+            game.release_item(item)
+        del items[len(saved):]
+
+    if snap.field is not None:
+        if game.obstacle_field is None:
+            game.create_obstacle_field()
+        field = game.obstacle_field
+        n = snap.field_count
+        if n > field.capacity:
+            field.allocate(n)
+        for name in FIELD_ARRAYS:
+            getattr(field, name)[:n] = snap.field[name][:n]
+        field.count = n
+
+    game.schedule_items()
+    game.restore_effects()
+
+    # last, taking actors from the pools must not change the random numbers
+    game.rng.setstate(snap.rng_state)
+
+
+def encode_value(value, output: bytearray) -> None:
+    """
+    Appends a value (None, bool, int, float, str or tuple of them)
+    to the output.
+    """
+    if value is None:
+        output += NONE
+    elif value is True or value is False:
+        output += TRUE if value else FALSE
+    elif isinstance(value, int):
+        output += INT
+        output += INT_VALUE.pack(value)
+    elif isinstance(value, float):
+        output += FLOAT
+        output += FLOAT_VALUE.pack(value)
+    elif isinstance(value, str):
+        data = value.encode()
+        output += TEXT
+        output += LENGTH.pack(len(data))
+        output += data
+    elif isinstance(value, tuple):
+        output += TUPLE
+        output += LENGTH.pack(len(value))
+        for element in value:
+            encode_value(element, output)
+    else:
+        raise TypeError("cannot encode {!r}".format(value))
+
+
+class Decoder(object):
+    """
+    Reads the values written by encode_value. Malformed data raises
+    a ValueError.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def take(self, size: int) -> bytes:
+        """
+        Returns the next bytes.
+        """
+        start = self.offset
+        if start + size > len(self.data):
+            raise ValueError("truncated snapshot")
+        self.offset += size
+        return self.data[start:self.offset]
+
+    def value(self):
+        """
+        Returns the next value.
+        """
+        tag = self.take(1)
+        if tag == NONE:
+            return None
+        if tag == FALSE:
+            return False
+        if tag == TRUE:
+            return True
+        if tag == INT:
+            return INT_VALUE.unpack(self.take(INT_VALUE.size))[0]
+        if tag == FLOAT:
+            return FLOAT_VALUE.unpack(self.take(FLOAT_VALUE.size))[0]
+        if tag == TEXT:
+            return self.take(self.length()).decode()
+        if tag == TUPLE:
+            return tuple(self.value() for _ in range(self.length()))
+        raise ValueError("unknown tag {!r} in snapshot".format(tag))
+
+    def length(self) -> int:
+        """
+        Returns the next length.
+        """
+        return LENGTH.unpack(self.take(LENGTH.size))[0]
+
+
+def encode(snap: GameSnapshot) -> bytes:
+    """
+    Encodes a snapshot: its values, its records with their slots in
+    order (the items' classes by name), then the obstacle field's
+    arrays.
+    """
+    output = bytearray()
+    for name in SCALARS:
+        encode_value(getattr(snap, name), output)
+
+    for saved in (snap.players, snap.obstacles, snap.items, snap.activated_items):
+        output += LENGTH.pack(len(saved))
+        for record in saved:
+            for name in record.__slots__:
+                value = getattr(record, name)
+                encode_value(value.__name__ if name == "cls" else value, output)
+
+    encode_value(snap.field is not None, output)
+    if snap.field is not None:
+        n = snap.field_count
+        for name in FIELD_ARRAYS:
+            output += snap.field[name][:n].astype(FIELD_TYPES[name]).tobytes()
+    return bytes(output)
+
+
+def decode(data: bytes) -> GameSnapshot:
+    """
+    Decodes a snapshot written by encode. Unknown item classes and
+    malformed data raise a ValueError.
+    """
+    decoder = Decoder(data)
+    snap = GameSnapshot()
+    for name in SCALARS:
+        setattr(snap, name, decoder.value())
+
+    for saved, cls in ((snap.players, PlayerRecord), (snap.obstacles, ObstacleRecord),
+                       (snap.items, ItemRecord), (snap.activated_items, ItemRecord)):
+        for _ in range(decoder.length()):
+            record = cls()
+            for name in cls.__slots__:
+                value = decoder.value()
+                if name == "cls":
+                    if value not in ITEM_CLASSES:
+                        raise ValueError("unknown item {!r} in snapshot".format(value))
+                    value = ITEM_CLASSES[value]
+                setattr(record, name, value)
+            saved.append(record)
+
+    if decoder.value():
+        # the obstacle field needs NumPy
+        import numpy
+        n = snap.field_count
+        snap.field = {}
+        for name in FIELD_ARRAYS:
+            dtype = numpy.dtype(FIELD_TYPES[name])
+            snap.field[name] = numpy.frombuffer(decoder.take(n * dtype.itemsize),
+                                                dtype=dtype).copy()
+    return snap
+
+
+if __name__ == '__main__':
+
+    import pygame
+    from simulation import Simulation
+
+    inputs = lambda game, frame: [pygame.K_a] if frame % 80 < 40 else [pygame.K_d, pygame.K_w]
+    sim = Simulation(2, inputs, seed=4)
+    game = sim.game
+    game.item_spawn_laps = 0.5
+    game.item_spawn_rate = 30
+    for player in game.players:
+        player.lifes = 100
+    assert sim.run(200) == 200
+
+    snap = snapshot(game)
+    digest = game.state_digest()
+    sim.run(300)
+    digests = [game.state_digest()]
+    assert digests[0] != digest
+
+    # restoring and running again gives the same frames
+    restore(game, snap)
+    assert game.state_digest() == digest
+    sim.run(300)
+    assert game.state_digest() == digests[0]
+
+    # encoded snapshots too
+    restore(game, decode(encode(snap)))
+    assert game.state_digest() == digest
+    try:
+        decode(encode(snap)[:-1])
+        assert False
+    except ValueError:
+        pass
+    forged = bytearray()
+    for name in SCALARS:
+        encode_value(getattr(snap, name), forged)
+    forged += LENGTH.pack(0) + LENGTH.pack(0) + LENGTH.pack(1)
+    for name in ItemRecord.__slots__:
+        encode_value("os.system" if name == "cls" else 0, forged)
+    try:
+        decode(bytes(forged))
+        assert False
+    except ValueError:
+        pass
+
+    # with the obstacle field
+    field_sim = Simulation(1, inputs, seed=5)
+    field_sim.game.create_obstacle_field()
+    field_sim.run(200)
+    field_digest = field_sim.game.state_digest()
+    encoded = encode(snapshot(field_sim.game))
+    field_sim.run(100)
+    restore(field_sim.game, decode(encoded))
+    assert field_sim.game.state_digest() == field_digest
+
+    # reused snapshots don't create records
+    records_before = [id(record) for record in snap.obstacles]
+    snapshot(game, snap)
+    assert [id(record) for record in snap.obstacles] == records_before
+
+    # nor do the restores create actors, once the pools hold them
+    pools = [game.obstacle_pool] + list(game.item_pools.values())
+    created = [pool.created for pool in pools]
+    for i in range(1000):
+        snapshot(game, snap)
+        restore(game, snap)
+    assert [pool.created for pool in pools] == created
+    assert [id(record) for record in snap.obstacles] == records_before
+    assert game.state_digest() == digest
@@ -0,0 +1,108 @@
+"""
+Spatial hash module.
+Uniform grid used as a broadphase for the collision detection.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+from pygame.rect import Rect
+
+
+class SpatialHash(object):
+    """
+    Uniform grid over a bounded area. Objects are inserted with
+    their bounding box, and a query returns every object sharing
+    a cell with the given box. The objects outside the bounds are
+    stored in the border cells.
+    """
+
+    # Size of a cell, in pixels
+    cell_size = 64
+
+    def __init__(self, bounds: Rect, cell_size: int = None):
+        if cell_size is not None:
+            self.cell_size = cell_size
+
+        self.bounds = Rect(bounds)
+        self.columns = max(1, -(-self.bounds.width // self.cell_size))
+        self.rows = max(1, -(-self.bounds.height // self.cell_size))
+
+        # cell index -> list of (insertion order, object)
+        self.cells = {}
+        self.count = 0
+
+    def cell_range(self, rect: Rect) -> (range, range):
+        """
+        Returns the columns and the rows covered by a rect.
+        """
+        size = self.cell_size
+        left = (rect.left - self.bounds.x) // size
+        right = (rect.right - 1 - self.bounds.x) // size
+        top = (rect.top - self.bounds.y) // size
+        bottom = (rect.bottom - 1 - self.bounds.y) // size
+
+        left = min(max(left, 0), self.columns - 1)
+        right = min(max(right, 0), self.columns - 1)
+        top = min(max(top, 0), self.rows - 1)
+        bottom = min(max(bottom, 0), self.rows - 1)
+
+        return range(left, right + 1), range(top, bottom + 1)
+
+    def clear(self) -> None:
+        """
+        Removes every object.
+        """
+        self.cells.clear()
+        self.count = 0
+
+    def insert(self, obj, rect: Rect) -> None:
+        """
+        Inserts an object covering the given rect.
+        """
+        entry = (self.count, obj)
+        self.count += 1
+
+        columns, rows = self.cell_range(rect)
+        for row in rows:
+            for column in columns:
+                key = row * self.columns + column
+                cell = self.cells.get(key)
+                if cell is None:
+                    self.cells[key] = [entry]
+                else:
+                    cell.append(entry)
+
+    def query(self, rect: Rect) -> list:
+        """
+        Returns the objects which may collide with the given rect,
+        in their insertion order.
+        """
+        found = {}
+        columns, rows = self.cell_range(rect)
+        for row in rows:
+            for column in columns:
+                cell = self.cells.get(row * self.columns + column)
+                if cell is not None:
+                    for order, obj in cell:
+                        found[order] = obj
+        return [found[order] for order in sorted(found)]
+
+
+if __name__ == '__main__':
+
+    grid = SpatialHash(Rect(0, 0, 400, 400), 100)
+    assert (grid.columns, grid.rows) == (4, 4)
+
+    grid.insert("a", Rect(10, 10, 20, 20))
+    grid.insert("b", Rect(90, 90, 20, 20))
+    grid.insert("c", Rect(300, 300, 20, 20))
+    # outside the bounds: stored in the border cells
+    grid.insert("d", Rect(-50, -50, 20, 20))
+
+    assert grid.query(Rect(0, 0, 50, 50)) == ["a", "b", "d"]
+    assert grid.query(Rect(150, 150, 10, 10)) == ["b"]
+    assert grid.query(Rect(350, 350, 10, 10)) == ["c"]
+    grid.clear()
+    assert grid.query(Rect(0, 0, 400, 400)) == []
@@ -0,0 +1,79 @@
+"""
+Text cache module.
+Keeps the rendered texts so that the same string isn't rendered
+again every frame.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+from collections import OrderedDict
+
+import pygame
+from pygame.font import Font
+from pygame.surface import Surface
+
+
+class TextCache(object):
+    """
+    Caches the surfaces rendered by the fonts, keyed by
+    (font, text, color, antialias). The least recently used
+    texts are evicted when the cache is full.
+    """
+
+    # Maximum number of stored texts
+    max_entries = 256
+
+    def __init__(self, max_entries: int = None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+
+        self.texts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font: Font, text: str, antialias: bool = True,
+               color: (int, int, int) = (255, 255, 255)) -> Surface:
+        """
+        Returns the rendered text. The returned surface is shared
+        and must not be modified.
+        """
+        key = (font, text, tuple(color), antialias)
+        surface = self.texts.get(key)
+
+        if surface is not None:
+            self.texts.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.texts[key] = surface
+        if len(self.texts) > self.max_entries:
+            self.texts.popitem(last=False)
+        return surface
+
+    def clear(self) -> None:
+        """
+        Empties the cache.
+        """
+        self.texts.clear()
+
+
+if __name__ == '__main__':
+
+    pygame.init()
+
+    font = pygame.font.Font(None, 20)
+    cache = TextCache(2)
+
+    hello = cache.render(font, "hello")
+    assert cache.render(font, "hello") is hello
+    assert cache.render(font, "hello", color=(0, 0, 0)) is not hello
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # "hello" in white is the least recently used
+    cache.render(font, "world")
+    assert len(cache.texts) == 2
+    assert cache.render(font, "hello") is not hello
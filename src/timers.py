@@ -0,0 +1,84 @@
+"""
+Timers module.
+Deadlines on the game clock kept in a min-heap, so that each frame
+only looks at the timers which are over.
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import heapq
+
+
+class Timers(object):
+    """
+    Min-heap of (deadline, target) pairs.
+    A target's timers are cancelled by increasing its timer
+    generation: the entries of an older generation are dropped
+    when they come out of the heap, without searching the heap.
+    """
+
+    def __init__(self):
+        # (deadline, order, generation, target)
+        self.heap = []
+        # order of the scheduled timers, breaks the deadlines' ties
+        self.order = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def schedule(self, deadline: float, target) -> None:
+        """
+        Schedules a timer of the target, over at deadline.
+        """
+        self.order += 1
+        heapq.heappush(self.heap, (deadline, self.order, target.timer, target))
+
+    @staticmethod
+    def cancel(target) -> None:
+        """
+        Cancels every timer of the target.
+        """
+        target.timer += 1
+
+    def expired(self, now: float) -> "list of object":
+        """
+        Removes the timers which are over at now and returns their
+        targets, the earliest first.
+        """
+        heap = self.heap
+        targets = []
+        while heap and heap[0][0] <= now:
+            deadline, order, generation, target = heapq.heappop(heap)
+            if generation == target.timer:
+                targets.append(target)
+        return targets
+
+    def clear(self) -> None:
+        """
+        Removes every timer.
+        """
+        del self.heap[:]
+
+
+if __name__ == '__main__':
+
+    class Target(object):
+        timer = 0
+
+    a, b, c = Target(), Target(), Target()
+    timers = Timers()
+    timers.schedule(2.0, b)
+    timers.schedule(1.0, a)
+    timers.schedule(3.0, c)
+
+    assert timers.expired(0.5) == []
+    assert timers.expired(2.0) == [a, b]
+
+    # cancelled timers are dropped, rescheduled ones kept
+    Timers.cancel(c)
+    timers.schedule(5.0, c)
+    assert timers.expired(4.0) == []
+    assert timers.expired(5.0) == [c]
+    assert len(timers) == 0
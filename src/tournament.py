@@ -0,0 +1,257 @@
+"""
+Tournament module.
+Plays many seeded headless games with bots, spread over a pool
+of processes, and aggregates the results per game settings.
+Used to tune the difficulty.
+
+    python tournament.py --games 1000 --players 2 --bot random
+    python tournament.py --config hard:MAXIMUM_OBSTACLE=20,obstacles_max_spawn_rate=8
+
+Pythalex - April 2018
+Ludum Dare 41
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from collections import OrderedDict
+
+from simulation import Simulation, use_dummy_drivers
+
+# Game attributes a config can change
+SETTINGS = ("obstacles_spawn_rate", "obstacles_max_spawn_rate", "item_spawn_rate",
+            "MAXIMUM_OBSTACLE")
+
+# name -> settings
+DEFAULT_CONFIGS = OrderedDict([
+    ("easy", {"obstacles_spawn_rate" : 1, "obstacles_max_spawn_rate" : 3,
+              "MAXIMUM_OBSTACLE" : 6}),
+    ("normal", {}),
+    ("hard", {"obstacles_spawn_rate" : 3, "obstacles_max_spawn_rate" : 8,
+              "MAXIMUM_OBSTACLE" : 20}),
+])
+
+# Game of the worker process, created once and reused by its tasks
+WORKER_GAME = None
+
+
+def init_worker() -> None:
+    """
+    Loads the game once per worker: window, fonts, images and
+    sounds are shared by every game played by the worker.
+    """
+    global WORKER_GAME
+    use_dummy_drivers()
+    from game import Game
+    WORKER_GAME = Game()
+
+
+def apply_settings(game: "Game", settings: dict) -> None:
+    """
+    Puts back the default settings, then changes the given ones.
+    """
+    for name in SETTINGS + ("obstacles_start_spawn_rate",):
+        game.__dict__.pop(name, None)
+    for name, value in settings.items():
+        if name not in SETTINGS:
+            raise ValueError("unknown setting: " + name)
+        setattr(game, name, value)
+        # the spawn rate is reset at the beginning of the rounds
+        if name == "obstacles_spawn_rate":
+            game.obstacles_start_spawn_rate = value
+
+
+def play(task: tuple) -> dict:
+    """
+    Plays one game and returns its result.
+    The task is (config name, settings, seed, number of players,
+    bot name, maximum number of frames).
+    """
+    from bots import BOTS, bots_inputs
+
+    name, settings, seed, nb_of_players, bot, max_frames = task
+    if WORKER_GAME is None:
+        init_worker()
+    game = WORKER_GAME
+
+    apply_settings(game, settings)
+    bots = [BOTS[bot](seed * 16 + i) for i in range(nb_of_players)]
+    sim = Simulation(nb_of_players, bots_inputs(bots), game=game, seed=seed)
+
+    # frame of death of each player
+    survival = [None] * nb_of_players
+    while not sim.ended and game.frame < max_frames:
+        sim.step()
+        for i, player in enumerate(game.players):
+            if survival[i] is None and not player.alive:
+                survival[i] = game.frame
+    survival = [frame if frame is not None else game.frame for frame in survival]
+    scores = [player.score if not player.alive else int(game.avoided)
+              for player in game.players]
+
+    # rank 1 is the best score, the longest survival breaks ties
+    order = sorted(range(nb_of_players), key=lambda i: (-scores[i], -survival[i]))
+    ranks = [0] * nb_of_players
+    for rank, i in enumerate(order):
+        ranks[i] = rank + 1
+
+    return {"config" : name, "seed" : seed, "frames" : game.frame, "scores" : scores,
+            "survival" : survival, "ranks" : ranks}
+
+
+def percentile(values: list, point: float) -> float:
+    """
+    Returns a percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * point / 100.0))]
+
+
+class Aggregate(object):
+    """
+    Statistics of the games of a config.
+    """
+
+    def __init__(self, nb_of_players: int):
+        self.games = 0
+        self.scores = []
+        self.survival = []
+        # seat -> number of games ended at each rank
+        self.ranks = [[0] * nb_of_players for _ in range(nb_of_players)]
+
+    def add(self, result: dict) -> None:
+        """
+        Adds the result of a game.
+        """
+        self.games += 1
+        self.scores += result["scores"]
+        self.survival += result["survival"]
+        for seat, rank in enumerate(result["ranks"]):
+            self.ranks[seat][rank - 1] += 1
+
+    def summary(self, fps: int = 60) -> "OrderedDict":
+        """
+        Returns the distributions of the scores and of the survival
+        times (in s), and the ranking of each seat.
+        """
+        summary = OrderedDict()
+        summary["games"] = self.games
+        for key, values, scale in (("score", self.scores, 1.0),
+                                   ("survival_s", self.survival, 1.0 / fps)):
+            values = sorted(value * scale for value in values)
+            summary[key] = OrderedDict([
+                ("mean", sum(values) / len(values) if values else 0.0),
+                ("p10", percentile(values, 10)),
+                ("p50", percentile(values, 50)),
+                ("p90", percentile(values, 90)),
+                ("max", values[-1] if values else 0.0)
+            ])
+        summary["win_rate"] = [counts[0] / float(max(1, self.games)) for counts in self.ranks]
+        summary["mean_rank"] = [sum((rank + 1) * count for rank, count in enumerate(counts)) /
+                                float(max(1, self.games)) for counts in self.ranks]
+        return summary
+
+
+def tasks(configs: dict, games: int, nb_of_players: int, bot: str, max_frames: int,
+          seed: int):
+    """
+    Yields the games to play: the same seeds are used for every
+    config, so that the configs are compared on the same games.
+    """
+    for i in range(games):
+        for name, settings in configs.items():
+            yield (name, settings, seed + i, nb_of_players, bot, max_frames)
+
+
+def run(configs: dict, games: int, nb_of_players: int = 2, bot: str = "random",
+        max_frames: int = 60 * 60 * 5, seed: int = 0, workers: int = None,
+        progress=None) -> "OrderedDict":
+    """
+    Plays the games over a pool of processes. The results are
+    aggregated as they come; progress, if given, is called with
+    each result. Returns the aggregates by config name.
+    """
+    aggregates = OrderedDict((name, Aggregate(nb_of_players)) for name in configs)
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(workers, initializer=init_worker)
+    try:
+        for result in pool.imap_unordered(play, tasks(configs, games, nb_of_players, bot,
+                                                      max_frames, seed)):
+            aggregates[result["config"]].add(result)
+            if progress is not None:
+                progress(result)
+    finally:
+        # SDL handles SIGTERM, so the workers must exit by themselves
+        pool.close()
+        pool.join()
+    return aggregates
+
+
+def parse_config(text: str) -> (str, dict):
+    """
+    Parses a config given as name:setting=value,setting=value
+    """
+    name, _, values = text.partition(":")
+    settings = {}
+    for item in values.split(","):
+        if item:
+            setting, _, value = item.partition("=")
+            settings[setting] = float(value) if "." in value else int(value)
+    return name, settings
+
+
+def main(argv: list = None) -> int:
+    from bots import BOTS
+
+    parser = argparse.ArgumentParser(description="Save Your Assteroid bots tournament")
+    parser.add_argument("--games", type=int, default=100, help="games per config")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--bot", default="random", choices=sorted(BOTS))
+    parser.add_argument("--config", action="append", metavar="NAME:SETTING=VALUE,...",
+                        help="config to play, the default ones if not given. Settings: " +
+                        ", ".join(SETTINGS))
+    parser.add_argument("--frames", type=int, default=60 * 60 * 5,
+                        help="maximum length of a game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes, one per core by default")
+    parser.add_argument("--output", metavar="FILE", help="writes the results as JSON")
+    args = parser.parse_args(argv)
+
+    configs = DEFAULT_CONFIGS
+    if args.config:
+        configs = OrderedDict(parse_config(text) for text in args.config)
+
+    total = args.games * len(configs)
+    done = [0]
+    start = time.time()
+
+    def progress(result):
+        done[0] += 1
+        if done[0] % 50 == 0 or done[0] == total:
+            sys.stderr.write("\r{}/{} games, {:.1f} games/s".format(
+                done[0], total, done[0] / (time.time() - start)))
+
+    aggregates = run(configs, args.games, args.players, args.bot, args.frames, args.seed,
+                     args.workers, progress)
+    sys.stderr.write("\n")
+
+    report = OrderedDict((name, aggregate.summary()) for name, aggregate in aggregates.items())
+    for name, summary in report.items():
+        print("{:<12} {:5d} games  score p50 {:6.1f} p90 {:6.1f}  survival p50 {:6.1f} s"
+              "  win rate {}".format(name, summary["games"], summary["score"]["p50"],
+                                     summary["score"]["p90"], summary["survival_s"]["p50"],
+                                     " ".join("{:.2f}".format(w) for w in summary["win_rate"])))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())